@@ -0,0 +1,20 @@
+"""Starts the fake Google servers and points call_alert at them.
+
+Settings are read on first use, so this must be imported before anything from `call_alert`.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from fake_servers import FakeGoogle
+
+__all__ = 'calendar_latency', 'fake', 'tts_latency'
+
+calendar_latency = 0.05
+tts_latency = 0.2
+
+fake = FakeGoogle(calendar_latency=calendar_latency, tts_latency=tts_latency)
+os.environ.update(fake.env())
+os.environ['CALL_ALERT_NOTIFICATION_BACKEND'] = 'memory'
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,235 @@
+"""Local stand-ins for the Google Calendar `events.list` and Text-to-Speech `text:synthesize` endpoints.
+
+Point call_alert at them with `CALL_ALERT_CALENDAR_API_URL` and `CALL_ALERT_TTS_API_URL`, e.g.:
+
+    with FakeGoogle(events=1000, calendar_latency=0.05) as fake:
+        os.environ.update(fake.env())
+
+Latency is simulated per request, requests are handled on separate threads so concurrent requests overlap as they
+would against the real APIs. Field masks are ignored, every event includes a `description` of `description_bytes`
+to simulate calendars with heavy invite bodies. Incremental syncs never find changes and reply 304 to requests with
+a matching `If-None-Match`. Speech is returned in the requested `audioEncoding`, encoding MP3 and OGG_OPUS requires
+the `audio` extra. Set `tts_status` to simulate a TTS outage.
+"""
+
+import base64
+import io
+import json
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Self
+from urllib.parse import parse_qs, urlsplit
+
+__all__ = 'FakeGoogle', 'encoded_audio', 'events_page', 'make_event'
+
+
+def make_event(
+    index: int, start: datetime, *, description_bytes: int = 0, calendar_id: str = 'primary'
+) -> dict[str, Any]:
+    """An event resource like those returned by the Calendar API, every other event has a Meet link."""
+    end = start + timedelta(minutes=30)
+    event: dict[str, Any] = {
+        'kind': 'calendar#event',
+        'id': f'event{index}',
+        'iCalUID': f'event{index}@google.com',
+        'status': 'confirmed',
+        'htmlLink': f'https://www.google.com/calendar/event?eid={index}',
+        'summary': f'Meeting {index}',
+        'description': 'x' * description_bytes,
+        'creator': {'email': calendar_id},
+        'organizer': {'email': calendar_id},
+        'start': {'dateTime': start.isoformat(), 'timeZone': 'Europe/London'},
+        'end': {'dateTime': end.isoformat(), 'timeZone': 'Europe/London'},
+        'attendees': [{'email': f'person{i}@example.com', 'responseStatus': 'accepted'} for i in range(5)],
+    }
+    if index % 2 == 0:
+        event['hangoutLink'] = f'https://meet.google.com/abc-defg-{index:03d}'
+    return event
+
+
+# ETag of every events list response, the calendar never changes
+sync_etag = '"sync-etag"'
+
+
+def events_page(
+    count: int,
+    *,
+    first: int = 0,
+    total: int | None = None,
+    description_bytes: int = 0,
+    next_page_token: str | None = None,
+    next_sync_token: str | None = None,
+) -> bytes:
+    """JSON for an events list response with events `first` to `first + count` out of `total`, spread over the next
+    two days.
+    """
+    start = datetime.now(tz=timezone.utc).replace(microsecond=0) + timedelta(minutes=10)
+    step = timedelta(days=2) / max(total or count, 1)
+    page: dict[str, Any] = {
+        'kind': 'calendar#events',
+        'etag': sync_etag,
+        'items': [
+            make_event(i, start + step * i, description_bytes=description_bytes) for i in range(first, first + count)
+        ],
+    }
+    if next_page_token:
+        page['nextPageToken'] = next_page_token
+    if next_sync_token:
+        page['nextSyncToken'] = next_sync_token
+    return json.dumps(page).encode()
+
+
+@cache
+def wav_bytes(size: int) -> bytes:
+    """A silent 24kHz mono 16 bit WAV file of about `size` bytes."""
+    data_size = max(size - 44, 0) & ~1
+    header = b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVEfmt '
+    header += struct.pack('<IHHIIHH', 16, 1, 1, 24000, 48000, 2, 16) + b'data' + struct.pack('<I', data_size)
+    return header + bytes(data_size)
+
+
+@cache
+def encoded_audio(encoding: str, size: int) -> bytes:
+    """Audio as returned by the TTS API, `size` is the size of the clip as LINEAR16.
+
+    Compressed clips are encoded from a tone with a syllable rate envelope and some noise, since silence would
+    compress unrealistically well.
+    """
+    if encoding == 'LINEAR16':
+        return wav_bytes(size)
+
+    import numpy as np
+    import soundfile
+
+    t = np.arange(max(size - 44, 0) // 2) / 24000
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    signal += np.random.default_rng(0).normal(0, 0.02, len(t))
+    buffer = io.BytesIO()
+    format, subtype = {'MP3': ('MP3', 'MPEG_LAYER_III'), 'OGG_OPUS': ('OGG', 'OPUS')}[encoding]
+    soundfile.write(buffer, signal, 24000, format=format, subtype=subtype)
+    return buffer.getvalue()
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # clients which gave up waiting on a slow response, e.g. because a hedged request won, aren't errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeGoogle:
+    """Serves fake Calendar and TTS APIs on a local port until closed."""
+
+    def __init__(
+        self,
+        *,
+        events: int = 100,
+        page_size: int = 250,
+        description_bytes: int = 2000,
+        calendar_latency: float = 0.05,
+        tts_latency: float = 0.2,
+        audio_bytes: int = 100_000,
+    ):
+        self.events = events
+        self.page_size = page_size
+        self.description_bytes = description_bytes
+        self.calendar_latency = calendar_latency
+        self.tts_latency = tts_latency
+        self.audio_bytes = audio_bytes
+        self.tts_status = 200
+        self.requests: dict[str, int] = {'calendar': 0, 'not_modified': 0, 'tts': 0}
+        self._pages: dict[int, bytes] = {}
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, without this small responses wait on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if not url.path.startswith('/calendar/') or not url.path.endswith('/events'):
+                    self.send_error(404)
+                    return
+                fake.requests['calendar'] += 1
+                time.sleep(fake.calendar_latency)
+                query = parse_qs(url.query)
+                if 'syncToken' in query and self.headers.get('If-None-Match') == sync_etag:
+                    fake.requests['not_modified'] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', sync_etag)
+                    self.end_headers()
+                    return
+                self.reply(fake.calendar_response(query))
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if self.path != '/tts/text:synthesize':
+                    self.send_error(404)
+                    return
+                fake.requests['tts'] += 1
+                time.sleep(fake.tts_latency)
+                if fake.tts_status != 200:
+                    self.send_error(fake.tts_status)
+                    return
+                encoding = body['audioConfig'].get('audioEncoding', 'LINEAR16')
+                audio = base64.b64encode(encoded_audio(encoding, fake.audio_bytes)).decode()
+                self.reply(json.dumps({'audioContent': audio}).encode())
+
+            def reply(self, body: bytes) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self._server = QuietServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host!s}:{port}/'
+
+    def env(self) -> dict[str, str]:
+        return {'CALL_ALERT_CALENDAR_API_URL': f'{self.url}calendar/v3/', 'CALL_ALERT_TTS_API_URL': f'{self.url}tts/'}
+
+    def calendar_response(self, query: dict[str, list[str]]) -> bytes:
+        if 'syncToken' in query:
+            # nothing has changed since the last sync
+            page = {'kind': 'calendar#events', 'etag': sync_etag, 'items': [], 'nextSyncToken': 'sync-2'}
+            return json.dumps(page).encode()
+        page = int(query.get('pageToken', ['0'])[0])
+        if page not in self._pages:
+            count = min(self.page_size, self.events - page * self.page_size)
+            last = (page + 1) * self.page_size >= self.events
+            self._pages[page] = events_page(
+                max(count, 0),
+                first=page * self.page_size,
+                total=self.events,
+                description_bytes=self.description_bytes,
+                next_page_token=None if last else str(page + 1),
+                next_sync_token='sync-1' if last else None,
+            )
+        return self._pages[page]
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
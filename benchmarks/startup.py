@@ -0,0 +1,140 @@
+"""Cold start benchmark for `python -m call_alert`.
+
+Records `-X importtime` for `call_alert.__main__` and the wall time from interpreter start until the first calendar
+poll would be sent (with credentials and the poll itself stubbed out so no network is needed). Exits non-zero if
+either regresses past the budget in `startup_budget.json`, or if any `call_alert` module fails to import, since
+modules imported lazily (e.g. `text_to_speech`) aren't otherwise imported until the first alert.
+
+Usage:
+
+    uv run python benchmarks/startup.py [--update-budget]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+root = Path(__file__).parent.parent
+budget_file = Path(__file__).parent / 'startup_budget.json'
+runs = 5
+# when updating the budget, allow this much headroom over the measured time
+headroom = 1.5
+
+first_poll_script = """
+import asyncio, os, sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import call_alert.__main__ as main_module
+from call_alert import alerts, calendar_get, state
+
+
+# not an `Exception`, so it isn't caught and retried by `EventAlerts.poll`
+class FirstPoll(BaseException):
+    pass
+
+
+def connect(cls, allow_auth_flow):
+    from google.oauth2.credentials import Credentials
+
+    expiry = datetime.now(tz=timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+    return cls(Credentials(token='benchmark', expiry=expiry), Path(os.devnull))
+
+
+def get_calendar_events(session, store, calendar_ids=None):
+    raise FirstPoll
+
+
+calendar_get.CalendarSession.connect = classmethod(connect)
+calendar_get.EventStore.load = classmethod(lambda cls, state=None: cls())
+open_state = state.StateStore.open
+state.StateStore.open = classmethod(lambda cls, path=None: open_state(Path(':memory:')))
+alerts.get_calendar_events = get_calendar_events
+try:
+    asyncio.run(main_module.run())
+except FirstPoll:
+    pass
+else:
+    sys.exit('first poll never happened')
+"""
+
+import_all_script = """
+import importlib, pkgutil
+
+import call_alert
+
+for module in pkgutil.iter_modules(call_alert.__path__, 'call_alert.'):
+    importlib.import_module(module.name)
+"""
+
+
+def import_all_error() -> str | None:
+    """Import every `call_alert` module, returns the error if any fails."""
+    p = subprocess.run([sys.executable, '-c', import_all_script], cwd=root, capture_output=True, text=True, check=False)
+    return p.stderr if p.returncode else None
+
+
+def import_time_ms() -> tuple[float, list[tuple[float, str]]]:
+    """Cumulative import time of `call_alert.__main__` and the slowest imports, from `-X importtime`."""
+    p = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import call_alert.__main__'],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports: list[tuple[float, str]] = []
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        imports.append((int(cumulative) / 1000, name.strip()))
+    total = next(ms for ms, name in imports if name == 'call_alert.__main__')
+    return total, sorted(imports, reverse=True)[:10]
+
+
+def first_poll_ms() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', first_poll_script], cwd=root, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> int:
+    if error := import_all_error():
+        print(f'FAIL: importing every module:\n{error}')
+        return 1
+
+    import_times: list[float] = []
+    first_polls: list[float] = []
+    slowest: list[tuple[float, str]] = []
+    for _ in range(runs):
+        ms, slowest = import_time_ms()
+        import_times.append(ms)
+        first_polls.append(first_poll_ms())
+
+    results = {'import_ms': statistics.median(import_times), 'first_poll_ms': statistics.median(first_polls)}
+    print(f'median of {runs} runs:')
+    for key, value in results.items():
+        print(f'  {key}: {value:0.1f}')
+    print('slowest imports (cumulative ms, last run):')
+    for ms, name in slowest:
+        print(f'  {ms:8.1f} {name}')
+
+    if '--update-budget' in sys.argv:
+        budget = {key: round(value * headroom) for key, value in results.items()}
+        budget_file.write_text(json.dumps(budget, indent=2) + '\n')
+        print(f'budget updated: {budget}')
+        return 0
+
+    budget = json.loads(budget_file.read_text())
+    failed = [key for key, value in results.items() if value > budget[key]]
+    for key in failed:
+        print(f'FAIL: {key} {results[key]:0.1f} exceeds budget of {budget[key]}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Benchmarks for polling, event validation and alerts, run against the local stand-ins in `fake_servers.py`.
+
+Measures:
+* validation time per event of an events list page at 100 to 10,000 events, and peak memory while validating
+* poll latency for a full sync and an incremental sync, for one and four calendars
+* alert latency, from an alert firing to its notification being delivered and its speech being ready to play, with
+  nothing cached, with only the phrases shared by every alert cached, and with everything cached, plus the number of
+  TTS requests for an event with a new summary
+* alert latency while TTS is down, before and after the circuit breaker opens, and while TTS is too slow to wait for
+* size of the TTS response for each audio encoding, and the time to decode it to PCM
+* peak memory of a full sync of 10,000 events
+* memory retained by a calendar of 1,000 events when first synced, and after a simulated week of polling
+
+Requires the `audio` extra.
+
+All results are "lower is better", the run fails if any is worse than `baseline.json` by more than `tolerance`.
+Timings within `noise_floor_ms` of their baseline always pass, however small the baseline.
+
+Usage:
+
+    uv run --extra audio python benchmarks/suite.py [--update-baseline]
+"""
+
+import asyncio
+import dataclasses
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# sets up the environment, so it must stay the first import of a local module, before `call_alert`
+from environment import calendar_latency, fake, tts_latency
+from fake_servers import encoded_audio, events_page, make_event
+from google.oauth2.credentials import Credentials
+
+from call_alert import alerts, http_client, presence, text_to_speech
+from call_alert.audio_cache import AudioCache
+from call_alert.audio_output import decode_audio, splice
+from call_alert.calendar_get import (
+    CalendarSession,
+    CalendarStore,
+    Event,
+    EventStore,
+    events_page_schema,
+    get_calendar_events,
+    stored_events,
+)
+from call_alert.notification import get_dispatcher
+from call_alert.settings import get_settings
+from call_alert.state import StateStore
+
+baseline_file = Path(__file__).parent / 'baseline.json'
+# fail when a result is worse than the baseline by more than this factor
+tolerance = 1.5
+# timings are only compared once they're this much slower than the baseline, sub-millisecond timings are mostly noise
+noise_floor_ms = 5
+# the event store may grow by at most this factor between a day and a week of polls, more means it's leaking
+leak_tolerance = 1.02
+runs = 5
+
+
+class BenchmarkToken:
+    def token(self) -> str:
+        return 'benchmark'
+
+
+def median_ms(func: Callable[[], object], repeat: int = runs) -> float:
+    times: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def peak_kb(func: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def session() -> CalendarSession:
+    expiry = datetime.now(tz=timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+    return CalendarSession(Credentials(token='benchmark', expiry=expiry), Path(os.devnull))
+
+
+def bench_validation(results: dict[str, float]) -> None:
+    for count in 100, 1000, 10_000:
+        page = events_page(count, description_bytes=fake.description_bytes)
+        ms = median_ms(lambda page=page: events_page_schema.validate_json(page))
+        results[f'validate_{count}_us_per_event'] = ms * 1000 / count
+    results['validate_10000_peak_kb'] = peak_kb(lambda: events_page_schema.validate_json(page))
+
+
+def bench_poll(results: dict[str, float], tmp: Path) -> None:
+    calendar_session = session()
+    state = StateStore.open(tmp / 'state.db')
+    for calendars in 1, 4:
+        calendar_ids = [f'calendar{i}' for i in range(calendars)]
+
+        def full_sync(calendar_ids: list[str] = calendar_ids) -> None:
+            store = EventStore.load(state)
+            store.calendars.clear()
+            get_calendar_events(calendar_session, store, calendar_ids)
+
+        results[f'poll_full_{calendars}_calendars_ms'] = median_ms(full_sync)
+        store = EventStore.load(state)
+        results[f'poll_incremental_{calendars}_calendars_ms'] = median_ms(
+            lambda store=store, calendar_ids=calendar_ids: get_calendar_events(calendar_session, store, calendar_ids)
+        )
+    # a restart: the stored event windows are loaded and alerts can be scheduled before the calendar is fetched
+    results['resume_4_calendars_ms'] = median_ms(lambda: stored_events(EventStore.load(state), calendar_ids))
+    state.close()
+
+    fake.events = 10_000
+    fake._pages.clear()
+    try:
+        results['poll_full_10000_events_peak_kb'] = peak_kb(
+            lambda: get_calendar_events(calendar_session, EventStore.load(StateStore.in_memory()), ['large'])
+        )
+    finally:
+        fake.events = 100
+        fake._pages.clear()
+
+
+def bench_memory(results: dict[str, float]) -> None:
+    """Memory held by the event store, which should stay flat however long the daemon runs.
+
+    A week of polls every 5 minutes is simulated in-process: each poll changes 10 of the 1,000 events and a full
+    sync is done once a day. Memory is recorded after the first full sync, then after a day and after a week, the
+    run fails if the last two differ by more than `leak_tolerance`.
+    """
+    count, changed_per_poll, polls_per_day = 1000, 10, 24 * 12
+    full_page = events_page(count, description_bytes=fake.description_bytes)
+    start = datetime.now(tz=timezone.utc) + timedelta(minutes=10)
+
+    def changed_page(first: int, version: int) -> bytes:
+        items = [
+            make_event(i, start, description_bytes=fake.description_bytes)
+            for i in range(first, first + changed_per_poll)
+        ]
+        return json.dumps({'items': [{**e, 'summary': f'{e["summary"]} v{version}'} for e in items]}).encode()
+
+    changed_pages = [
+        changed_page(first, version) for version in range(2) for first in range(0, count, changed_per_poll)
+    ]
+    store = CalendarStore()
+
+    def full_sync() -> None:
+        previous = store.events
+        store.reset(start + timedelta(days=7))
+        for event in events_page_schema.validate_json(full_page).items:
+            store.apply(event, previous)
+
+    def retained_kb() -> float:
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] / 1024
+
+    tracemalloc.start()
+    try:
+        full_sync()
+        results['event_store_1000_events_kb'] = retained_kb()
+        for poll in range(1, 7 * polls_per_day + 1):
+            if poll % polls_per_day == 0:
+                full_sync()
+            else:
+                for event in events_page_schema.validate_json(changed_pages[poll % len(changed_pages)]).items:
+                    store.apply(event)
+            if poll == polls_per_day:
+                results['event_store_after_day_of_polls_kb'] = retained_kb()
+        results['event_store_after_week_of_polls_kb'] = retained_kb()
+    finally:
+        tracemalloc.stop()
+
+
+def bench_alert(results: dict[str, float], tmp: Path) -> None:
+    text_to_speech.token_provider = BenchmarkToken()  # type: ignore[assignment]
+    # no audio device is needed, speech is considered delivered once it's ready to play
+    text_to_speech.play_segments = lambda paths, device=None: None
+    presence.get_detector = lambda: presence.NoPresence()
+    dispatcher = get_dispatcher()
+    settings = get_settings()
+    now = datetime.now(tz=timezone.utc)
+    event = Event('benchmark', 'Benchmark', now, now + timedelta(minutes=30), 'https://meet.google.com/abc-defg-hij')
+
+    def alert(cache_dir: Path, summary: str = 'Benchmark') -> None:
+        text_to_speech.audio_cache = AudioCache(cache_dir)
+        asyncio.run(alerts.event_alert(dataclasses.replace(event, summary=summary), 2, settings, alerts.AlertRoute()))
+        dispatcher.flush(5)
+
+    cold = iter(range(runs))
+    results['alert_cold_ms'] = median_ms(lambda: alert(tmp / f'tts-cold-{next(cold)}'))
+    results['alert_warm_ms'] = median_ms(lambda: alert(tmp / 'tts-warm'))
+    # the shared phrases are already in the warm cache, so only the new summary needs synthesizing
+    new = iter(range(runs))
+    requests = fake.requests['tts']
+    results['alert_new_summary_ms'] = median_ms(lambda: alert(tmp / 'tts-warm', f'Benchmark {next(new)}'))
+    results['alert_new_summary_tts_requests'] = (fake.requests['tts'] - requests) / runs
+
+    # while TTS is down or slow, only the shared phrases (already cached) are spoken
+    fake.tts_status = 503
+    try:
+        results['alert_tts_down_ms'] = median_ms(lambda: alert(tmp / 'tts-warm', 'Down'), settings.tts_breaker_failures)
+        results['alert_tts_down_circuit_open_ms'] = median_ms(lambda: alert(tmp / 'tts-warm', 'Down'))
+    finally:
+        fake.tts_status = 200
+        text_to_speech.get_breaker.cache_clear()
+    fake.tts_latency = 10
+    try:
+        results['alert_tts_slow_ms'] = median_ms(lambda: alert(tmp / 'tts-warm', 'Slow'), 1)
+    finally:
+        fake.tts_latency = tts_latency
+    results['notification_delivery_ms'] = statistics.median(dispatcher.latencies) * 1000
+
+
+def bench_encodings(results: dict[str, float], tmp: Path) -> None:
+    for encoding, suffix in text_to_speech.encoding_suffixes.items():
+        request_data = {'audioConfig': {**text_to_speech.audio_config, 'audioEncoding': encoding}, 'input': {}}
+        r = http_client.request('POST', f'{fake.url}tts/text:synthesize', json=request_data)
+        r.raise_for_status()
+        results[f'tts_{encoding.lower()}_response_kb'] = len(r.content) / 1024
+        path = tmp / f'clip{suffix}'
+        path.write_bytes(encoded_audio(encoding, fake.audio_bytes))
+        results[f'tts_{encoding.lower()}_decode_ms'] = median_ms(lambda path=path: decode_audio(path))
+
+    # joining the three segments of an alert's speech
+    pcm, sample_rate = decode_audio(tmp / 'clip.mp3')
+    results['splice_3_segments_ms'] = median_ms(lambda: splice([pcm, pcm, pcm], sample_rate))
+
+
+def regressed(key: str, value: float, baseline: float) -> bool:
+    if key.endswith('_ms') and value - baseline < noise_floor_ms:
+        return False
+    return value > baseline * tolerance
+
+
+def main() -> int:
+    results: dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_validation(results)
+        bench_poll(results, Path(tmp))
+        bench_memory(results)
+        bench_alert(results, Path(tmp))
+        bench_encodings(results, Path(tmp))
+    fake.close()
+
+    print(f'median of {runs} runs, calendar latency {calendar_latency}s, TTS latency {tts_latency}s:')
+    for key, value in results.items():
+        print(f'  {key}: {value:0.2f}')
+
+    # checked regardless of the baseline, a leak which stays within `tolerance` of it still grows without bound
+    day_kb, week_kb = results['event_store_after_day_of_polls_kb'], results['event_store_after_week_of_polls_kb']
+    if week_kb > day_kb * leak_tolerance:
+        print(f'FAIL: event store grew from {day_kb:0.2f}KB after a day of polls to {week_kb:0.2f}KB after a week')
+        return 1
+
+    if '--update-baseline' in sys.argv:
+        baseline_file.write_text(json.dumps({k: round(v, 2) for k, v in results.items()}, indent=2) + '\n')
+        print(f'baseline updated: {baseline_file}')
+        return 0
+
+    baseline = json.loads(baseline_file.read_text())
+    failed = [key for key, value in results.items() if key in baseline and regressed(key, value, baseline[key])]
+    for key in failed:
+        print(f'FAIL: {key} {results[key]:0.2f} is more than {tolerance}x the baseline of {baseline[key]}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
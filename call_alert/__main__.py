@@ -1,13 +1,16 @@
+import asyncio
 import logging
-import time
-from datetime import datetime, timedelta, timezone
-
-from .calendar_get import TimeRangeCalEvent, get_calendar_events
-from .camera import camera_active
-from .notification import notify
-from .text_to_speech import play_text
-
-default_sleep = timedelta(minutes=5)
+from datetime import timedelta
+from functools import partial
+
+from .alerts import EventAlerts
+from .calendar_get import CalendarSession, EventStore
+from .http_client import close_client
+from .metrics import start_metrics
+from .notification import flush_notifications, notify
+from .scheduler import Scheduler
+from .settings import get_settings
+from .state import StateStore
 
 logger = logging.getLogger('call_alert')
 
@@ -17,88 +20,57 @@ logging.basicConfig(
 
 
 def main():
-    first_step = True
     try:
-        # iterate indefinitely looking for events
-        while True:
-            cal_events = get_calendar_events(first_step)
-            first_step = False
-            if not cal_events:
-                logger.info(f'No upcoming calls, waiting {display_interval(default_sleep)}')
-                time.sleep(default_sleep.total_seconds())
-                continue
-
-            next_event = cal_events[0]
-            time_until_start = next_event.start - datetime.now(tz=timezone.utc)
-            if time_until_start > timedelta():
-                sleep_time = min(default_sleep, time_until_start)
-                logger.info(
-                    f'Next calls starts at {next_event.start} in {display_interval(time_until_start)}, '
-                    f'waiting {sleep_time.total_seconds():0.0f} seconds'
-                )
-                time.sleep(sleep_time.total_seconds())
-            else:
-                event_sequence(next_event)
+        asyncio.run(run())
     except KeyboardInterrupt:
         logger.info('stopped')
     except Exception as e:
         notify('Call Alert Error!', f'Call alert crashed: {e}', sound='error')
+        # notifications are sent on a daemon thread, make sure this one is shown before exiting
+        flush_notifications()
         raise
-
-
-def event_sequence(event: TimeRangeCalEvent):
-    logger.info(f'Starting event sequence for event "{event.summary}" starting at {event.start}...')
-    for sleep_time in [120, 360]:
-        event_alert(event)
-        time.sleep(sleep_time)
-
-    event_alert(event)
-    logger.info(f'Ended event sequence for event "{event.summary}".')
-
-
-def event_alert(event: TimeRangeCalEvent):
-    time_since_start = datetime.now(tz=timezone.utc) - event.start
-    minutes = int(time_since_start.total_seconds() / 60)
-    if camera_active():
-        logger.info(f'Skipping {minutes} minute{plural(minutes)} notification for "{event.summary}", camera active')
-    else:
-        if minutes == 0:
-            notify(f'Call has just started', event.summary, link=event.video_link)
-            play_text(f'Your call "{event.summary}" has just started')
-        else:
-            notify(f'Call started {minutes} minute{plural(minutes)} ago', event.summary, link=event.video_link)
-            play_text(
-                f'Your call "{event.summary}" started {int_as_word(minutes)} minute{plural(minutes)} ago, JOIN IT NOW!'
+    finally:
+        close_client()
+
+
+async def run():
+    settings = get_settings()
+    start_metrics(settings.metrics_host, settings.metrics_port, settings.metrics_jsonl)
+    state = StateStore.open()
+    store = EventStore.load(state)
+    scheduler = Scheduler()
+    alerts = EventAlerts(None, store, scheduler, settings, state=state)
+    # alerts for stored events are scheduled straight away, the calendar is fetched once connected
+    alerts.resume()
+
+    def start_pushes(session: CalendarSession) -> None:
+        if not settings.push_address:
+            return
+        from .calendar_push import CalendarPush, PushReceiver
+
+        receiver = PushReceiver(settings.push_host, settings.push_port)
+        for calendar_id in settings.calendar_ids:
+            push = CalendarPush(
+                session,
+                scheduler,
+                receiver,
+                settings.push_address,
+                ttl=settings.push_ttl,
+                on_change=alerts.poll_soon,
+                calendar_id=calendar_id,
             )
+            push.start()
+            alerts.pushes.append(push)
 
-
-def display_interval(delta: timedelta) -> str:
-    if delta < timedelta(minutes=1):
-        return 'less than a minute'
-    elif delta < timedelta(hours=1):
-        minutes = int(delta.total_seconds() / 60)
-        return f'{minutes} minute{plural(minutes)}'
-    elif delta < timedelta(days=1):
-        hours = int(delta.total_seconds() / 3600)
-        return f'{int_as_word(hours)} hour{plural(hours)}'
-    elif delta < timedelta(days=2):
-        hours = int((delta.total_seconds() - 86400) / 3600)
-        return f'1 day, {int_as_word(hours)} hour{plural(hours)}'
-    else:
-        days = int(delta.total_seconds() / 86400)
-        return f'{int_as_word(days)} day{plural(days)}'
-
-
-def int_as_word(v: int) -> str:
-    words = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+    # the session is built once and reused, the auth flow can only run here at startup
+    connect = partial(CalendarSession.connect, allow_auth_flow=True)
+    scheduler.call_later(timedelta(), 'connect', lambda: alerts.connect(connect, on_connected=start_pushes))
     try:
-        return words[v]
-    except IndexError:
-        return str(v)
-
-
-def plural(n: int) -> str:
-    return 's' if n != 1 else ''
+        await scheduler.run()
+    finally:
+        for push in alerts.pushes:
+            await push.stop()
+        state.close()
 
 
 if __name__ == '__main__':
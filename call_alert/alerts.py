@@ -0,0 +1,537 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from .calendar_get import CalendarSession, Event, EventStore, get_calendar_events, stored_events
+from .metrics import incr, set_gauge, span
+from .notification import NotificationDispatcher, notify
+from .scheduler import Scheduler, Timer
+from .settings import Settings
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from concurrent.futures import Future
+    from pathlib import Path
+
+    from .calendar_push import CalendarPush
+    from .presence import PresenceDetector
+    from .state import StateStore
+
+__all__ = 'AlertRoute', 'EventAlerts', 'alert_offsets', 'int_as_word', 'plural'
+
+logger = logging.getLogger('call_alert.alerts')
+
+# when alerts are given relative to the start of an event
+alert_offsets = [timedelta(), timedelta(minutes=2), timedelta(minutes=8)]
+# events which started longer ago than this are no longer returned by `get_calendar_events`
+event_window_start = timedelta(minutes=5)
+# poll at least this many times between now and the start of the next call
+polls_before_start = 3
+# the phrases shared by every alert are pre-rendered this long after starting, so they don't slow the first poll
+prerender_phrases_delay = timedelta(seconds=10)
+# after a failed poll or connection, retry after this long, doubling with each failure in a row
+retry_min_interval = timedelta(seconds=10)
+
+
+def backoff(min_interval: timedelta, doublings: int, max_interval: timedelta) -> timedelta:
+    """`min_interval` doubled `doublings` times, up to `max_interval`."""
+    # the exponent is capped so the multiplication can't overflow
+    return min(min_interval * 2 ** min(doublings, 16), max_interval)
+
+
+def retry_interval(failures: int, max_interval: timedelta) -> timedelta:
+    """How long to wait before retrying after `failures` failures in a row, up to `max_interval`."""
+    return backoff(retry_min_interval, failures - 1, max_interval)
+
+
+@dataclass
+class AlertRoute:
+    """Where alerts go, by default notifications use the process-wide dispatcher and speech the default voice.
+
+    `presence` is whether the host's camera and microphones show the user is in a call, it should only be set for
+    users at the host. Speech plays on `audio_device`, by default the host's default output.
+    """
+
+    dispatcher: NotificationDispatcher | None = None
+    speak: bool = True
+    voice: str | None = None
+    presence: bool = True
+    audio_device: str | None = None
+
+    def notify(self, title: str, message: str, *, link: str | None = None) -> None:
+        if self.dispatcher:
+            self.dispatcher.notify(title, message, link=link)
+        else:
+            notify(title, message, link=link)
+
+
+@dataclass
+class EventSequence:
+    event: Event
+    timers: list[Timer] = field(default_factory=list[Timer])
+
+    def cancel(self) -> None:
+        for timer in self.timers:
+            timer.cancel()
+
+
+class EventAlerts:
+    """Polls the calendar and keeps a sequence of alert timers scheduled for every upcoming event.
+
+    Sequences for different events run independently, when an event is moved or deleted its pending timers are
+    cancelled (and rescheduled if it was moved). The poll interval adapts, see `poll_interval`. `calendar_ids` and
+    `route` override the calendars from settings and where alerts go, e.g. for one of many users sharing a scheduler.
+
+    If `state` is set, every alert given or skipped is logged there and never repeated, even after a restart.
+    `session` may be `None` until connected, `resume` can schedule alerts from stored events in the meantime.
+    """
+
+    def __init__(
+        self,
+        session: CalendarSession | None,
+        store: EventStore,
+        scheduler: Scheduler,
+        settings: Settings,
+        *,
+        calendar_ids: list[str] | None = None,
+        route: AlertRoute | None = None,
+        state: StateStore | None = None,
+    ):
+        self.session = session
+        self.store = store
+        self.scheduler = scheduler
+        self.settings = settings
+        self.calendar_ids = calendar_ids
+        self.route = route or AlertRoute()
+        self.state = state
+        self.sequences: dict[str, EventSequence] = {}
+        # one per calendar to receive push notifications of changes, polling then becomes a backstop
+        self.pushes: list[CalendarPush] = []
+        self._poll_lock = asyncio.Lock()
+        self._next_poll: Timer | None = None
+        # polls in a row which found nothing changed, the interval doubles with each
+        self._unchanged_polls = 0
+        # polls and connection attempts in a row which failed, they're retried with backoff rather than stopping the
+        # scheduler
+        self._failed_polls = 0
+        self._failed_connects = 0
+
+    def resume(self) -> None:
+        """Schedule alerts for the events stored as of the last sync, without waiting to fetch the calendar."""
+        events = stored_events(self.store, self.calendar_ids)
+        self.reconcile(events)
+        logger.info(f'Resumed {len(events)} stored upcoming call{plural(len(events))}')
+
+    async def connect(
+        self,
+        connect: Callable[[], CalendarSession],
+        *,
+        on_connected: Callable[[CalendarSession], None] | None = None,
+        name: str = 'Google Calendar',
+    ) -> None:
+        """Connect `session` by calling `connect` in a thread, then call `on_connected` and start polling.
+
+        If connecting fails, e.g. while offline, it's retried with backoff and alerts already scheduled from stored
+        events carry on. `name` describes what's being connected to in logs.
+        """
+        try:
+            self.session = session = await asyncio.to_thread(connect)
+        except Exception:
+            self._failed_connects += 1
+            interval = retry_interval(self._failed_connects, self.settings.poll_max_interval)
+            incr('connect_errors_total')
+            logger.exception(f'Error connecting to {name}, retrying in {display_interval(interval)}')
+            self.scheduler.call_later(
+                interval, 'connect', lambda: self.connect(connect, on_connected=on_connected, name=name)
+            )
+            return
+        self._failed_connects = 0
+        if on_connected:
+            on_connected(session)
+        self.start()
+
+    def start(self) -> None:
+        """Start polling, `session` must be connected."""
+        self.poll_soon()
+        if self.route.speak:
+            self.scheduler.call_later(prerender_phrases_delay, 'prerender phrases', self.prerender_phrases)
+
+    def poll_soon(self) -> None:
+        """Poll immediately, e.g. because a push notification says the calendar has changed."""
+        if self._next_poll:
+            self._next_poll.cancel()
+        self._next_poll = self.scheduler.call_later(timedelta(), 'poll', self.poll)
+
+    def poll_interval(self) -> timedelta:
+        """How long until the next poll.
+
+        While push notifications are live, polling is only a backstop. Otherwise the interval starts at
+        `poll_min_interval` after a change and doubles with each poll that finds nothing changed, up to
+        `poll_max_interval`, but is kept short enough to poll a few more times before the next call starts.
+        """
+        if self.pushes and all(push.live for push in self.pushes):
+            return self.settings.push_poll_interval
+        min_interval, max_interval = self.settings.poll_min_interval, self.settings.poll_max_interval
+        interval = backoff(min_interval, self._unchanged_polls, max_interval)
+        now = datetime.now(tz=timezone.utc)
+        if upcoming := [s.event.start for s in self.sequences.values() if s.event.start > now]:
+            interval = min(interval, (min(upcoming) - now) / polls_before_start)
+        return max(min_interval, interval)
+
+    async def poll(self) -> None:
+        assert self.session is not None, 'polling before the calendar session is connected'
+        # the next poll is scheduled first so polling carries on however this poll ends
+        self._next_poll = fallback = self.scheduler.call_later(self.poll_interval(), 'poll', self.poll)
+        try:
+            async with self._poll_lock:
+                with span('poll'):
+                    cal_events = await asyncio.to_thread(
+                        get_calendar_events, self.session, self.store, self.calendar_ids
+                    )
+                changed = self.reconcile(cal_events)
+        except Exception:
+            # scheduled alerts are kept, a failed poll (e.g. while offline) mustn't stop the scheduler,
+            # fetch errors are already counted by the span
+            self._failed_polls += 1
+            interval = retry_interval(self._failed_polls, self.settings.poll_max_interval)
+            logger.exception(f'Error polling calendar, retrying in {display_interval(interval)}')
+            if self._next_poll is fallback:
+                fallback.cancel()
+                self._next_poll = self.scheduler.call_later(interval, 'poll', self.poll)
+            return
+        self._failed_polls = 0
+        self._unchanged_polls = 0 if changed else self._unchanged_polls + 1
+        if self.state:
+            self.state.prune_alerts(datetime.now(tz=timezone.utc))
+        interval = self.poll_interval()
+        # reschedule now the interval is known, unless `poll_soon` has already replaced the next poll
+        if self._next_poll is fallback:
+            fallback.cancel()
+            self._next_poll = self.scheduler.call_later(interval, 'poll', self.poll)
+        if cal_events:
+            next_event = cal_events[0]
+            time_until_start = next_event.start - datetime.now(tz=timezone.utc)
+            logger.info(
+                f'{len(cal_events)} upcoming call{plural(len(cal_events))}, next "{next_event.summary}" starts at '
+                f'{next_event.start} in {display_interval(time_until_start)}, polling again in '
+                f'{display_interval(interval)}'
+            )
+        else:
+            logger.info(f'No upcoming calls, polling again in {display_interval(interval)}')
+
+    def reconcile(self, cal_events: list[Event]) -> bool:
+        """Schedule alerts for new events, reschedule moved events and cancel alerts for deleted events.
+
+        Returns whether any alerts were scheduled, rescheduled or cancelled.
+        """
+        changed = False
+        current = {event.id: event for event in cal_events}
+        for event_id, event in current.items():
+            if sequence := self.sequences.get(event_id):
+                if sequence.event.start == event.start:
+                    sequence.event = event
+                    continue
+                logger.info(f'"{event.summary}" moved from {sequence.event.start} to {event.start}, rescheduling')
+                sequence.cancel()
+            self.sequences[event_id] = self.schedule(event)
+            changed = True
+
+        window_start = datetime.now(tz=timezone.utc) - event_window_start
+        for event_id, sequence in list(self.sequences.items()):
+            if event_id in current:
+                continue
+            if sequence.event.start > window_start:
+                # the event would still have been returned, so it's been deleted or lost its video link
+                logger.info(f'"{sequence.event.summary}" removed, cancelling alerts')
+                sequence.cancel()
+                del self.sequences[event_id]
+                changed = True
+            elif sequence.event.start + alert_offsets[-1] < window_start:
+                del self.sequences[event_id]
+        return changed
+
+    def schedule(self, event: Event) -> EventSequence:
+        sequence = EventSequence(event)
+        now = datetime.now(tz=timezone.utc)
+        prerender_at = event.start - self.settings.prerender_lead
+        sequence.timers.append(
+            self.scheduler.call_at(max(prerender_at, now), f'prerender {event.id}', lambda: self.prerender(sequence))
+        )
+
+        # alerts already given or skipped, e.g. before a restart, aren't repeated
+        fired = self.state.fired_offsets(event.id, event.start) if self.state else set[timedelta]()
+        due = [offset for offset in alert_offsets if event.start + offset >= now and offset not in fired]
+        missed = [offset for offset in alert_offsets if event.start + offset < now]
+        if missed and not any(offset >= missed[-1] for offset in fired):
+            # better late than never, give the most recent missed alert now
+            due.insert(0, missed[-1])
+        for offset in due:
+            sequence.timers.append(
+                self.scheduler.call_at(
+                    max(event.start + offset, now),
+                    f'alert {event.id} +{offset}',
+                    lambda offset=offset: self.alert(sequence, offset),
+                )
+            )
+        return sequence
+
+    async def prerender(self, sequence: EventSequence) -> None:
+        if self.session:
+            await asyncio.to_thread(prerender_event, sequence.event, self.session, self.route)
+
+    async def prerender_phrases(self) -> None:
+        await asyncio.to_thread(prerender_phrases, self.route)
+
+    async def alert(self, sequence: EventSequence, offset: timedelta) -> None:
+        event = sequence.event
+        scheduled = event.start + offset
+        fired = datetime.now(tz=timezone.utc)
+        lateness = fired - scheduled
+        if lateness > timedelta(minutes=1):
+            minutes = int((fired - event.start).total_seconds() / 60)
+        else:
+            minutes = int(offset.total_seconds() / 60)
+        if offset == alert_offsets[0]:
+            logger.info(f'Starting event sequence for event "{event.summary}" starting at {event.start}...')
+        logger.info(f'Alert for "{event.summary}" scheduled at {scheduled} fired {lateness.total_seconds():0.2f}s late')
+
+        def record(outcome: str) -> None:
+            if self.state:
+                self.state.record_alert(event.id, event.start, offset, outcome, datetime.now(tz=timezone.utc))
+
+        with span('alert'):
+            await event_alert(event, minutes, self.settings, self.route, scheduled=scheduled, on_handled=record)
+        if offset == alert_offsets[-1]:
+            logger.info(f'Ended event sequence for event "{event.summary}".')
+
+
+def prerender_event(event: Event, session: CalendarSession, route: AlertRoute):
+    """Synthesize every segment needed by an event's alerts and refresh tokens before the event starts.
+
+    This means when alerts are due, only local playback is left to do.
+    """
+    from .text_to_speech import get_auth_token, prepare_segments
+
+    start = time.perf_counter()
+    try:
+        session.refresh_if_needed()
+        if route.speak:
+            get_auth_token()
+            for offset in alert_offsets:
+                speech = alert_speech(event.summary, int(offset.total_seconds() / 60))
+                prepare_segments(speech, route.voice, route.audio_device)
+    except Exception:
+        logger.exception(f'Error pre-rendering alerts for "{event.summary}"')
+    else:
+        logger.info(f'Pre-rendered alerts for "{event.summary}" in {time.perf_counter() - start:0.2f} seconds')
+
+
+def prerender_phrases(route: AlertRoute):
+    """Synthesize the segments shared by every event's alerts, after this usually only an event's summary needs
+    synthesizing, and only once since it's cached.
+    """
+    from .text_to_speech import prepare_segments
+
+    phrases = {segment for offset in alert_offsets for segment in alert_speech('', int(offset.total_seconds() / 60))}
+    phrases.discard('')
+    try:
+        prepare_segments(sorted(phrases), route.voice, route.audio_device)
+    except Exception:
+        logger.exception('Error pre-rendering alert phrases')
+
+
+async def event_alert(
+    event: Event,
+    minutes: int,
+    settings: Settings,
+    route: AlertRoute,
+    *,
+    scheduled: datetime | None = None,
+    on_handled: Callable[[str], None] | None = None,
+) -> None:
+    """Give an alert, the presence check, speech synthesis and notification all run concurrently.
+
+    Synthesis of each segment of the speech starts straight away alongside the presence check, the notification is
+    shown as soon as the presence check passes and speech starts playing as soon as its first segment is ready,
+    unless the camera has become active in the meantime. Each stage has its own deadline so a slow stage doesn't
+    hold up the others, and speech failing never stops the notification. `on_handled` is called with the outcome,
+    "given" or "skipped", as soon as it's decided.
+    """
+    # presence and TTS backends are imported on first use, they're slow to import and not needed to poll
+    from .presence import NoPresence, get_detector
+    from .text_to_speech import start_segments
+
+    start = time.perf_counter()
+    detector = get_detector() if route.presence else NoPresence()
+    title, speech = alert_messages(event, minutes)
+    chunks = start_segments(speech, route.voice) if route.speak else []
+    try:
+        if await presence_active(detector, settings.alert_presence_timeout):
+            logger.info(f'Skipping {minutes} minute{plural(minutes)} notification for "{event.summary}", camera active')
+            incr('alerts_total', outcome='skipped')
+            if on_handled:
+                on_handled('skipped')
+            return
+
+        route.notify(title, event.summary, link=event.video_link)
+        incr('alerts_total', outcome='given')
+        if on_handled:
+            on_handled('given')
+        if scheduled:
+            # how long after the alert was due it was actually given, whether the delay was in scheduling or here
+            set_gauge('alert_lateness_seconds', (datetime.now(tz=timezone.utc) - scheduled).total_seconds())
+        logger.info(f'Notification for "{event.summary}" queued after {time.perf_counter() - start:0.2f}s')
+
+        if chunks:
+            await speak_alert(event, speech, chunks, detector, settings, start, route.audio_device)
+    finally:
+        for chunk in chunks:
+            chunk.cancel()
+
+
+async def speak_alert(
+    event: Event,
+    speech: list[str],
+    chunks: list[Future[Path]],
+    detector: PresenceDetector,
+    settings: Settings,
+    start: float,
+    device: str | None = None,
+) -> None:
+    """Play an alert's speech on `device`, starting as soon as its first segment is ready.
+
+    Segments which are ready are played together while later segments are still being synthesized, e.g. the cached
+    "Your call" plays while the event's summary is synthesized. Presence is checked again before each part, so the
+    rest of the speech is skipped if the camera becomes active. Any error is logged rather than raised.
+    """
+    from .text_to_speech import play_segments
+
+    loop = asyncio.get_running_loop()
+    # the deadline only covers waiting for synthesis, not playback
+    deadline = loop.time() + settings.alert_speech_timeout.total_seconds()
+    fallback_at = loop.time() + settings.alert_speech_fallback_after.total_seconds()
+    futures = [asyncio.wrap_future(chunk) for chunk in chunks]
+    done = 0
+    played = False
+    try:
+        while done < len(futures):
+            async with asyncio.timeout_at(deadline):
+                paths, count = await next_segments(speech[done:], futures[done:], fallback_at)
+            done += count
+            if not paths:
+                continue
+            if not played:
+                logger.info(f'Speech for "{event.summary}" ready after {time.perf_counter() - start:0.2f}s')
+            if await presence_active(detector, settings.alert_presence_timeout):
+                logger.info(f'Camera became active, skipping speech for "{event.summary}"')
+                return
+            await asyncio.to_thread(play_segments, paths, device)
+            played = True
+        if not played:
+            logger.warning(f'No speech available for "{event.summary}", skipping')
+    except TimeoutError:
+        incr('timeouts_total', stage='speech')
+        logger.warning(f'Speech for "{event.summary}" not ready within {settings.alert_speech_timeout}, skipping')
+    except Exception:
+        incr('errors_total', span='speech')
+        logger.exception(f'Error speaking alert for "{event.summary}"')
+
+
+async def next_segments(
+    segments: list[str], futures: list[asyncio.Future[Path]], fallback_at: float
+) -> tuple[list[Path], int]:
+    """Audio for the segments at the start of `segments` which are ready, waiting for at least the first.
+
+    Returns the audio and how many segments it covers. Segments which fail, or aren't synthesized by `fallback_at`
+    (in event loop time), use the offline voice instead. If there's no offline voice they're left out, e.g. without
+    the event's summary an alert still says "Your call has just started" since the shared phrases are cached.
+    """
+    from .text_to_speech import offline_synthesize
+
+    loop = asyncio.get_running_loop()
+    await asyncio.wait(futures[:1], timeout=max(fallback_at - loop.time(), 0))
+    paths: list[Path] = []
+    count = 0
+    for segment, future in zip(segments, futures):
+        if count and not future.done() and loop.time() < fallback_at:
+            # still being synthesized, play what's ready first
+            break
+        count += 1
+        if future.done() and future.exception() is None:
+            paths.append(future.result())
+            continue
+        if future.done():
+            logger.warning(f'Synthesizing "{segment}" failed, falling back: {future.exception()!r}')
+        else:
+            future.cancel()
+            logger.warning(f'Synthesizing "{segment}" not finished in time, falling back')
+        incr('tts_fallbacks_total')
+        if path := await asyncio.to_thread(offline_synthesize, segment):
+            paths.append(path)
+    return paths, count
+
+
+async def presence_active(detector: PresenceDetector, timeout: timedelta) -> bool:
+    """Whether the user is in a call, if the check takes longer than `timeout` assume not so the alert is given."""
+    try:
+        with span('presence'):
+            return await asyncio.wait_for(asyncio.to_thread(detector.active), timeout.total_seconds())
+    except TimeoutError:
+        incr('timeouts_total', stage='presence')
+        logger.warning(f'Presence check took longer than {timeout}, assuming not in a call')
+        return False
+    except Exception:
+        # e.g. a PyObjC or /proc error, the alert is still given, the span counts it in `errors_total`
+        logger.exception('Error checking presence, assuming not in a call')
+        return False
+
+
+def alert_messages(event: Event, minutes: int) -> tuple[str, list[str]]:
+    """Notification title and segments of the spoken text for an alert `minutes` after `event` started."""
+    if minutes == 0:
+        title = 'Call has just started'
+    else:
+        title = f'Call started {minutes} minute{plural(minutes)} ago'
+    return title, alert_speech(event.summary, minutes)
+
+
+def alert_speech(summary: str, minutes: int) -> list[str]:
+    """Segments of the spoken text for an alert, only `summary` varies between events."""
+    if minutes == 0:
+        return ['Your call', summary, 'has just started']
+    else:
+        return ['Your call', summary, f'started {int_as_word(minutes)} minute{plural(minutes)} ago, JOIN IT NOW!']
+
+
+def display_interval(delta: timedelta) -> str:
+    if delta < timedelta(minutes=1):
+        return 'less than a minute'
+    elif delta < timedelta(hours=1):
+        minutes = int(delta.total_seconds() / 60)
+        return f'{minutes} minute{plural(minutes)}'
+    elif delta < timedelta(days=1):
+        hours = int(delta.total_seconds() / 3600)
+        return f'{int_as_word(hours)} hour{plural(hours)}'
+    elif delta < timedelta(days=2):
+        hours = int((delta.total_seconds() - 86400) / 3600)
+        return f'1 day, {int_as_word(hours)} hour{plural(hours)}'
+    else:
+        days = int(delta.total_seconds() / 86400)
+        return f'{int_as_word(days)} day{plural(days)}'
+
+
+def int_as_word(v: int) -> str:
+    words = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+    try:
+        return words[v]
+    except IndexError:
+        return str(v)
+
+
+def plural(n: int) -> str:
+    return 's' if n != 1 else ''
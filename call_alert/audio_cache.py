@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any
+
+__all__ = 'AudioCache', 'CacheStats'
+
+logger = logging.getLogger('call_alert.audio_cache')
+
+# files being written, which eviction ignores
+temp_prefix = '.tmp-'
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class AudioCache:
+    """Content-addressed on-disk cache of synthesized speech with size-bounded LRU eviction.
+
+    Files are named by a hash of everything that affects the audio, with a suffix for the audio's encoding, the
+    file's mtime is bumped on every hit so eviction can remove the least recently used files first.
+    """
+
+    def __init__(self, directory: Path, *, max_bytes: int = 100 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, voice_name: str, language_code: str, audio_config: dict[str, Any]) -> str:
+        raw = json.dumps([text, voice_name, language_code, audio_config], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str, suffix: str = '.wav') -> Path | None:
+        """Path of the cached audio for `key`, or `None` on a miss."""
+        path = self._path(key, suffix)
+        with self._lock:
+            try:
+                # mark as recently used
+                os.utime(path)
+            except FileNotFoundError:
+                self.stats.misses += 1
+                return None
+            else:
+                self.stats.hits += 1
+                return path
+
+    def put(self, key: str, audio: bytes, suffix: str = '.wav') -> Path:
+        """Store audio for `key`, the write is atomic so a crash can never leave a truncated file in the cache."""
+        path = self._path(key, suffix)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=self.directory, prefix=temp_prefix, delete=False) as fp:
+            try:
+                fp.write(audio)
+            except BaseException:
+                os.unlink(fp.name)
+                raise
+        os.replace(fp.name, path)
+        with self._lock:
+            self._evict()
+        return path
+
+    def _evict(self) -> None:
+        files: list[tuple[float, int, Path]] = []
+        total = 0
+        for path in self.directory.iterdir():
+            if path.name.startswith(temp_prefix):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.stats.evictions += 1
+            logger.debug('Evicted %s from audio cache', path.name)
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.directory / f'{key}{suffix}'
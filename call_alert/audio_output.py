@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, cast
+
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    import numpy as np
+    from sounddevice import OutputStream
+
+    Pcm = np.ndarray[tuple[int, int], np.dtype[np.int16]]
+
+# overlap between segments of an utterance, long enough to hide the join but too short to hear as an overlap
+crossfade = 0.03
+# leading and trailing silence beyond this is trimmed from segments before they're joined
+max_segment_silence = 0.08
+# samples quieter than this (out of 32767) count as silence
+silence_threshold = 300
+
+__all__ = 'AudioOutput', 'OutputName', 'PlaysoundOutput', 'StreamOutput', 'decode_audio', 'get_output', 'output_for'
+
+logger = logging.getLogger('call_alert.audio_output')
+
+OutputName = Literal['auto', 'stream', 'playsound']
+
+
+class AudioOutput(ABC):
+    @abstractmethod
+    def play(self, path: Path) -> None:
+        """Play an audio file, returns once it's been handed to the device."""
+
+    def play_segments(self, paths: list[Path]) -> None:
+        """Play clips which together make up one utterance, by default one after another."""
+        for path in paths:
+            self.play(path)
+
+    def preload(self, path: Path) -> None:  # pyright: ignore[reportUnusedParameter]
+        """Get ready to play `path` without delay, by default there's nothing to do."""
+
+    def close(self) -> None:
+        pass
+
+
+class PlaysoundOutput(AudioOutput):
+    """Plays each file with `playsound`, which starts a new player for every clip."""
+
+    def play(self, path: Path) -> None:
+        # imported lazily to keep startup fast
+        from playsound import playsound  # type: ignore
+
+        playsound(str(path))
+
+
+class StreamOutput(AudioOutput):
+    """Decodes clips in-process to PCM and writes them to one output stream which stays open between clips.
+
+    Requires the `audio` extra (soundfile and sounddevice). The last `max_decoded` decoded clips are kept in memory,
+    so clips preloaded before an alert play without decoding or opening the device. Clips are played one at a time,
+    so concurrent alerts never talk over each other. Segments of an utterance are spliced into one clip with a short
+    crossfade at each join. `device` is a sounddevice device name or index, by default the host's default output.
+    """
+
+    max_decoded = 64
+
+    def __init__(self, device: str | None = None):
+        import sounddevice
+        import soundfile  # noqa: F401  # pyright: ignore[reportUnusedImport] imported to check it's installed
+
+        self.device = device
+        self._sounddevice = sounddevice
+        self._stream: OutputStream | None = None
+        self._decoded: OrderedDict[Path, tuple[Pcm, int]] = OrderedDict()
+        self._decoded_lock = threading.Lock()
+        self._play_lock = threading.Lock()
+
+    def decode(self, path: Path) -> tuple[Pcm, int]:
+        with self._decoded_lock:
+            if (decoded := self._decoded.get(path)) is not None:
+                self._decoded.move_to_end(path)
+                return decoded
+        pcm, sample_rate = decode_audio(path)
+        with self._decoded_lock:
+            self._decoded[path] = pcm, sample_rate
+            while len(self._decoded) > self.max_decoded:
+                self._decoded.popitem(last=False)
+        return pcm, sample_rate
+
+    def preload(self, path: Path) -> None:
+        pcm, sample_rate = self.decode(path)
+        with self._play_lock:
+            self._open(sample_rate, pcm.shape[1])
+
+    def play(self, path: Path) -> None:
+        pcm, sample_rate = self.decode(path)
+        self._write(pcm, sample_rate)
+
+    def play_segments(self, paths: list[Path]) -> None:
+        decoded = [self.decode(path) for path in paths]
+        if len({(sample_rate, pcm.shape[1]) for pcm, sample_rate in decoded}) > 1:
+            # can't be spliced, e.g. clips cached with different settings
+            super().play_segments(paths)
+            return
+        sample_rate = decoded[0][1]
+        self._write(splice([pcm for pcm, _ in decoded], sample_rate), sample_rate)
+
+    def _write(self, pcm: Pcm, sample_rate: int) -> None:
+        with self._play_lock:
+            stream = self._open(sample_rate, pcm.shape[1])
+            try:
+                stream.write(pcm)
+            except Exception:
+                # reopen next time in case the device has gone away
+                self._close()
+                raise
+
+    def close(self) -> None:
+        with self._play_lock:
+            self._close()
+
+    def _open(self, sample_rate: int, channels: int) -> OutputStream:
+        """The open stream, reopened if the format has changed, the play lock must be held."""
+        if self._stream and (self._stream.samplerate != sample_rate or self._stream.channels != channels):
+            self._close()
+        if self._stream is None:
+            self._stream = self._sounddevice.OutputStream(
+                device=self.device, samplerate=sample_rate, channels=channels, dtype='int16'
+            )
+            self._stream.start()
+            logger.debug('Opened audio output at %dHz', sample_rate)
+        return self._stream
+
+    def _close(self) -> None:
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+
+def decode_audio(path: Path) -> tuple[Pcm, int]:
+    """Decode a file in any encoding the TTS API returns to 16 bit PCM, returns the samples and sample rate."""
+    import soundfile
+
+    pcm, sample_rate = soundfile.read(path, dtype='int16', always_2d=True)
+    return cast('Pcm', pcm), sample_rate
+
+
+def splice(clips: list[Pcm], sample_rate: int) -> Pcm:
+    """Join clips into one, trimming long silences at each join and crossfading the clips into each other."""
+    import numpy as np
+
+    keep = int(max_segment_silence * sample_rate)
+    overlap = int(crossfade * sample_rate)
+    joined = np.zeros((0, clips[0].shape[1]), dtype=np.float32)
+    for i, clip in enumerate(clips):
+        loud = np.flatnonzero(np.abs(clip).max(axis=1) > silence_threshold)
+        if len(loud):
+            # the start of the first clip and end of the last clip aren't joins so are left alone
+            start = 0 if i == 0 else max(loud[0] - keep, 0)
+            end = len(clip) if i == len(clips) - 1 else loud[-1] + 1 + keep
+            clip = clip[start:end]
+        samples = clip.astype(np.float32)
+        n = min(overlap, len(joined), len(samples))
+        if n:
+            fade = np.linspace(0, 1, n, dtype=np.float32)[:, None]
+            samples[:n] = joined[-n:] * (1 - fade) + samples[:n] * fade
+            joined = joined[:-n]
+        joined = np.concatenate([joined, samples])
+    return joined.astype(np.int16)
+
+
+def get_output() -> AudioOutput:
+    """The host's default output, "auto" streams if the `audio` extra is installed and uses playsound otherwise."""
+    return output_for(None)
+
+
+@cache
+def output_for(device: str | None) -> AudioOutput:
+    """Output for an audio device, speech for users sharing a device goes through one output so it never overlaps."""
+    output_name = get_settings().audio_output
+    if output_name != 'playsound':
+        try:
+            return StreamOutput(device)
+        except (ImportError, OSError) as e:
+            # OSError if sounddevice can't find PortAudio
+            if output_name == 'stream':
+                raise
+            logger.info('Audio streaming not available, playing clips with playsound: %s', e)
+    if device is not None:
+        logger.warning('playsound can only play to the default output, not %r', device)
+    return PlaysoundOutput()
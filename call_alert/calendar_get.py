@@ -1,37 +1,161 @@
 from __future__ import annotations
 
+import heapq
+import json
+import logging
 import re
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
+from functools import cache
 from pathlib import Path
-from typing import Any
+from typing import Annotated, Any, Literal
 
-from google.auth.transport.requests import Request as GoogleRequest
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build as build_calendar_service
-from pydantic import AliasPath, BaseModel, Field, TypeAdapter, computed_field
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from pydantic import AliasPath, BaseModel, Field, TypeAdapter
+
+from .http_client import Httplib2Adapter, google_auth_request
+from .metrics import incr, span
+from .settings import get_settings
+from .state import StateStore
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+# how far ahead of now we look for events
+lookahead = timedelta(days=2)
+# how far ahead a full sync fetches, once `lookahead` passes the end of this a full resync is required
+sync_horizon = timedelta(days=7)
+# partial response field mask covering only what `AllDayCalEvent` and `TimeRangeCalEvent` need,
+# `description` is still required to find video links, e.g. for Zoom or Microsoft Teams
+event_fields = (
+    'id,iCalUID,status,summary,creator/email,organizer/email,htmlLink,hangoutLink,location,description,start,end'
+)
+page_fields = f'etag,items({event_fields}),nextPageToken,nextSyncToken'
+# links to join a video call, searched for in an event's location then its description, in order of preference
+video_link_patterns = [
+    re.compile(r'https://meet\.google\.com/[a-z]+-[a-z]+-[a-z]+'),
+    re.compile(r'https://(?:[\w-]+\.)*zoom\.us/(?:j|my|w)/[^\s<>"\']+'),
+    re.compile(r'https://teams\.microsoft\.com/(?:l/meetup-join|meet)/[^\s<>"\']+'),
+    # only meeting links, not e.g. the help links in invitation footers, the site name may come first in the path
+    re.compile(r'https://(?:[\w-]+\.)*webex\.com/(?:[\w-]+/)?(?:meet/|join/|j\.php|wbxmjs/joinservice/)[^\s<>"\']*'),
+    # Teams invitations in plain text, the link may be wrapped, e.g. by Outlook's safe links
+    re.compile(r'(?<=Join the meeting now<)[^\s<>]+'),
+]
+# punctuation which ends a sentence or closes brackets around a link rather than being part of it
+link_trailing_chars = '.,;)'
+
+logger = logging.getLogger('call_alert.calendar')
+
+__all__ = (
+    'get_calendar_events',
+    'stored_events',
+    'Event',
+    'TimeRangeCalEvent',
+    'CalendarStore',
+    'EventStore',
+    'CalendarSession',
+)
+
+
+def get_calendar_events(
+    session: CalendarSession, store: EventStore | None = None, calendar_ids: list[str] | None = None
+) -> list[Event]:
+    """Fetch calendar events which are not all-day and have a video link, in their compact form.
+
+    Calendars (by default `calendar_ids` from settings) are fetched concurrently on a bounded pool, their events are
+    merged into one list ordered by start time and events which appear in more than one calendar are only included
+    once. If `store` is provided, it's updated with an incremental sync rather than fetching the whole window.
 
+    With a store, a calendar which can't be fetched contributes its stored events as of its last sync, so one failed
+    fetch doesn't look like every event in that calendar has been deleted. The error is only raised if every
+    calendar fails, or for any failure without a store.
+    """
+    settings = get_settings()
+    calendar_ids = calendar_ids or settings.calendar_ids
+    session.refresh_if_needed()
+    service = session.service
+    min_datetime = datetime.now(tz=timezone.utc) - timedelta(minutes=5)
+
+    if store is None:
+
+        def fetch(calendar_id: str) -> list[Event]:
+            events = get_upcoming_appointments(service, min_datetime, calendar_id=calendar_id)
+            return [e.compact() for e in events if isinstance(e, TimeRangeCalEvent)]
 
-__all__ = 'get_calendar_events', 'TimeRangeCalEvent'
+    else:
+        calendar_stores = {calendar_id: store.calendar(calendar_id) for calendar_id in calendar_ids}
 
+        def fetch(calendar_id: str) -> list[Event]:
+            calendar_store = calendar_stores[calendar_id]
+            if sync_calendar_events(service, calendar_store, min_datetime, calendar_id=calendar_id):
+                calendar_store.changed = True
+            return calendar_store.window(min_datetime, min_datetime + lookahead)
 
-def get_calendar_events(allow_auth_flow: bool) -> list[TimeRangeCalEvent]:
-    """Fetch calendar events which are not all-day and have a video link."""
-    service = authenticate_google_calendar(allow_auth_flow)
+    per_calendar: list[list[Event]] = []
+    errors: list[Exception] = []
+    executor = get_calendar_executor()
+    for calendar_id, future in [(c, executor.submit(fetch, c)) for c in calendar_ids]:
+        try:
+            per_calendar.append(future.result())
+        except Exception as e:
+            incr('calendar_errors_total')
+            if store is None:
+                raise
+            logger.exception('Error fetching events for calendar %r, using its stored events', calendar_id)
+            errors.append(e)
+            per_calendar.append(store.calendar(calendar_id).window(min_datetime, min_datetime + lookahead))
+    if len(errors) == len(calendar_ids):
+        raise errors[0]
+    if store is not None:
+        store.save_if_changed()
+    return alert_events(per_calendar, min_datetime)
+
+
+def stored_events(store: EventStore, calendar_ids: list[str] | None = None) -> list[Event]:
+    """The events `get_calendar_events` would return, from the store as of its last sync without fetching."""
+    calendar_ids = calendar_ids or get_settings().calendar_ids
     min_datetime = datetime.now(tz=timezone.utc) - timedelta(minutes=5)
-    raw_events = get_upcoming_appointments(service, min_datetime)
-    events = events_schema.validate_python(raw_events)
-    return [
-        event
-        for event in events
-        if isinstance(event, TimeRangeCalEvent) and event.video_link and event.start > min_datetime
+    per_calendar = [
+        store.calendars[c].window(min_datetime, min_datetime + lookahead) for c in calendar_ids if c in store.calendars
     ]
+    return alert_events(per_calendar, min_datetime)
+
+
+def alert_events(per_calendar: list[list[Event]], min_datetime: datetime) -> list[Event]:
+    return [event for event in merge_events(per_calendar) if event.video_link and event.start > min_datetime]
+
+
+@cache
+def get_calendar_executor() -> ThreadPoolExecutor:
+    """Pool used to fetch calendars, shared by every user so the number of concurrent requests stays bounded."""
+    return ThreadPoolExecutor(max_workers=get_settings().calendar_concurrency, thread_name_prefix='calendar')
+
+
+def merge_events(per_calendar: Iterable[list[Event]]) -> list[Event]:
+    """Merge lists of events each ordered by start time, dropping events already seen in an earlier calendar."""
+    seen: set[tuple[str, datetime]] = set()
+    events: list[Event] = []
+    for event in heapq.merge(*per_calendar, key=lambda e: e.start):
+        key = event.ical_uid or event.id, event.start
+        if key not in seen:
+            seen.add(key)
+            events.append(event)
+    return events
 
 
 class CalEvent(BaseModel):
+    """An event as returned by the Calendar API, converted to `Event` to be kept."""
+
+    id: str
+    # the same for copies of an event in different calendars
+    ical_uid: str | None = Field(None, validation_alias='iCalUID')
     # unused and I'm not sure what other values `status` can take, hence disabled
     # status: Literal['confirmed']
     summary: str
@@ -42,19 +166,18 @@ class CalEvent(BaseModel):
     # location can be a link, e.g. zoom link
     location: str | None = None
     description: str | None = None
-    attendees: list[dict[str, Any]] | None = None
 
-    @computed_field
     @property
     def video_link(self) -> str | None:
         if self.hangout_link:
             return self.hangout_link
-        elif self.location:
-            if self.location.startswith('http'):
-                return self.location
-            elif 'microsoft teams' in self.location.lower() and self.description:
-                if m := re.search('Join the meeting now<(.+?)>', self.description):
-                    return m.group(1)
+        elif self.location and self.location.startswith('http'):
+            return self.location
+        for text in self.location, self.description:
+            if text:
+                for pattern in video_link_patterns:
+                    if m := pattern.search(text):
+                        return m.group().rstrip(link_trailing_chars)
         return None
 
 
@@ -69,56 +192,338 @@ class TimeRangeCalEvent(CalEvent):
     end: datetime = Field(validation_alias=AliasPath('end', 'dateTime'))
     end_timezone: str = Field(validation_alias=AliasPath('end', 'timeZone'))
 
+    def compact(self) -> Event:
+        return Event(self.id, self.summary, self.start, self.end, self.video_link, self.ical_uid)
+
+
+@dataclass(slots=True, frozen=True)
+class Event:
+    """The compact form events are kept in once fetched, with only what's needed to alert on them.
+
+    The video link is found once when the event is fetched and the description, which can be large, is dropped.
+    """
+
+    id: str
+    summary: str
+    start: datetime
+    end: datetime
+    video_link: str | None = None
+    # the same for copies of an event in different calendars
+    ical_uid: str | None = None
+
+
+class CancelledEvent(BaseModel):
+    """A deleted event as returned by an incremental sync, only `id` and `status` are set."""
+
+    id: str
+    status: Literal['cancelled']
+
+
+# cancelled events must be tried first since other fields are sometimes included for them too
+PageEvent = Annotated[CancelledEvent | AllDayCalEvent | TimeRangeCalEvent, Field(union_mode='left_to_right')]
+
 
-events_schema = TypeAdapter(list[AllDayCalEvent | TimeRangeCalEvent])
+class EventsPage(BaseModel):
+    items: list[PageEvent] = []
+    next_page_token: str | None = Field(None, validation_alias='nextPageToken')
+    next_sync_token: str | None = Field(None, validation_alias='nextSyncToken')
+    etag: str | None = None
+
+
+# pages are validated straight from the response bytes, without building intermediate dicts
+events_page_schema = TypeAdapter(EventsPage)
 Service = Any
 
 
-def authenticate_google_calendar(allow_auth_flow: bool) -> Service:
-    """Authenticate and return Google Calendar service object."""
+class CalendarStore(BaseModel):
+    """Local copy of one calendar's upcoming events, kept up to date using the Calendar API's sync tokens.
+
+    Only time range events are stored since all-day events are never alerted on.
+    """
+
+    sync_token: str | None = None
+    # ETag of the last incremental sync response, sent as `If-None-Match` so an unchanged calendar costs a 304
+    etag: str | None = None
+    synced_until: datetime | None = None
+    events: dict[str, Event] = {}
+
+    # set when a sync changes the calendar, so the store is only saved when needed
+    changed: bool = Field(default=False, exclude=True)
+
+    def window(self, start: datetime, end: datetime) -> list[Event]:
+        """Events starting between `start` and `end`, ordered by start time."""
+        return sorted((e for e in self.events.values() if start <= e.start < end), key=lambda e: e.start)
+
+    def reset(self, synced_until: datetime) -> None:
+        self.sync_token = None
+        self.etag = None
+        self.synced_until = synced_until
+        self.events = {}
+
+    def apply(self, event: PageEvent, previous: dict[str, Event] | None = None) -> None:
+        """Apply a single changed (or deleted) event from a sync.
+
+        If the event is unchanged from the stored event (or the event in `previous`, the events before a full sync)
+        the stored object is kept, so events which don't change aren't reallocated on every sync.
+        """
+        if isinstance(event, TimeRangeCalEvent):
+            compact = event.compact()
+            existing = (self.events if previous is None else previous).get(event.id)
+            if existing is None or existing != compact:
+                existing = compact
+            self.events[event.id] = existing
+        else:
+            # deleted, or an event might have changed from a time range to all-day
+            self.events.pop(event.id, None)
+
+    def prune(self, before: datetime) -> None:
+        """Drop events which ended before `before` so the store doesn't grow indefinitely."""
+        self.events = {k: e for k, e in self.events.items() if e.end >= before}
+
+
+class EventStore(BaseModel):
+    """Local copies of every calendar's upcoming events, keyed by calendar ID and saved in the state store."""
+
+    calendars: dict[str, CalendarStore] = {}
+
+    _state: StateStore | None = None
+
+    @classmethod
+    def load(cls, state: StateStore | None = None) -> EventStore:
+        """Load the calendars saved in `state`, without a state store events are only kept in memory."""
+        store = cls()
+        if state is not None:
+            for calendar_id, data in state.calendars().items():
+                try:
+                    store.calendars[calendar_id] = CalendarStore.model_validate_json(data)
+                except ValueError as e:
+                    logger.warning('Invalid stored calendar %r, ignoring: %s', calendar_id, e)
+        store._state = state
+        return store
+
+    def save(self) -> None:
+        self._save(self.calendars)
+
+    def save_if_changed(self) -> None:
+        """Save only the calendars changed since they were last saved."""
+        self._save({calendar_id: c for calendar_id, c in self.calendars.items() if c.changed})
+
+    def _save(self, calendars: dict[str, CalendarStore]) -> None:
+        if self._state is not None and calendars:
+            self._state.save_calendars({calendar_id: c.model_dump_json() for calendar_id, c in calendars.items()})
+        for calendar in calendars.values():
+            calendar.changed = False
+
+    def calendar(self, calendar_id: str) -> CalendarStore:
+        return self.calendars.setdefault(calendar_id, CalendarStore())
+
+
+def sync_calendar_events(
+    service: Service, store: CalendarStore, min_datetime: datetime, *, calendar_id: str = 'primary'
+) -> bool:
+    """Bring `store` up to date, returns whether anything changed.
+
+    Uses the stored sync token to fetch only changed or deleted events, falling back to a full sync of
+    `sync_horizon` when there's no token, the token has been invalidated (HTTP 410) or the window has moved past
+    the end of the last full sync. Incremental syncs are conditional on the last response's ETag, so when nothing
+    has changed the API replies 304 with no body.
+    """
+    if store.sync_token and store.synced_until and store.synced_until >= min_datetime + lookahead:
+        try:
+            page = list_event_pages(service, calendar_id=calendar_id, etag=store.etag, syncToken=store.sync_token)
+        except HttpError as e:
+            if e.status_code == 304:
+                store.prune(min_datetime)
+                incr('calendar_syncs_total', kind='not_modified')
+                return False
+            elif e.status_code != 410:
+                raise
+            logger.info('Sync token invalidated, doing a full sync')
+            incr('calendar_sync_token_invalidated_total')
+        else:
+            for event in page.items:
+                store.apply(event)
+            changed = bool(page.items) or page.next_sync_token != store.sync_token
+            store.sync_token = page.next_sync_token
+            store.etag = page.etag
+            store.prune(min_datetime)
+            incr('calendar_syncs_total', kind='incremental')
+            return changed
+
+    synced_until = min_datetime + sync_horizon
+    page = list_event_pages(
+        service,
+        calendar_id=calendar_id,
+        timeMin=rfc3339(min_datetime),
+        timeMax=rfc3339(synced_until),
+    )
+    previous = store.events
+    store.reset(synced_until)
+    for event in page.items:
+        store.apply(event, previous)
+    store.sync_token = page.next_sync_token
+    # the calendar's ETag is the same whichever way it's listed, so the next incremental sync can already be a 304
+    store.etag = page.etag
+    logger.info('Full calendar sync, %d events stored', len(store.events))
+    incr('calendar_syncs_total', kind='full')
+    return True
+
+
+def list_event_pages(
+    service: Service, *, calendar_id: str, max_results: int = 250, etag: str | None = None, **params: Any
+) -> EventsPage:
+    """Fetch all pages of an events list request, returns all their events with the last page's `nextSyncToken`.
+
+    If `etag` is set the first request is conditional on it, raising `HttpError` with status 304 if it still
+    matches. The result's `etag` is only set for single page responses.
+
+    `orderBy` is deliberately not used since it can't be combined with sync tokens.
+    """
+    events: list[PageEvent] = []
+    page_token: str | None = None
+    while True:
+        request = service.events().list(
+            calendarId=calendar_id,
+            maxResults=max_results,
+            singleEvents=True,
+            pageToken=page_token,
+            fields=page_fields,
+            **params,
+        )
+        if etag and page_token is None:
+            request.headers['If-None-Match'] = etag
+        page = fetch_page(request)
+        # an ETag only stands for the whole response when there's one page
+        single_page = page_token is None
+        events.extend(page.items)
+        page_token = page.next_page_token
+        if not page_token:
+            return EventsPage.model_construct(
+                items=events, next_sync_token=page.next_sync_token, etag=page.etag if single_page else None
+            )
+
+
+def fetch_page(request: HttpRequest) -> EventsPage:
+    with span('calendar_request'):
+        body = execute_raw(request)
+    with span('calendar_validate'):
+        return events_page_schema.validate_json(body)
+
+
+def execute_raw(request: HttpRequest) -> bytes:
+    """Execute a request, returning the response body rather than parsed JSON so it can be validated directly.
+
+    Error responses still raise `HttpError`. googleapiclient already asks for gzip responses, which the shared
+    HTTP client decompresses.
+    """
+
+    def postproc(_response: object, content: bytes) -> bytes:
+        return content
+
+    request.postproc = postproc
+    return request.execute()
+
+
+@cache
+def calendar_document() -> dict[str, Any]:
+    """The Calendar API discovery document, which ships with google-api-python-client.
+
+    It's parsed once per process and shared by every session.
+    """
+    doc = get_static_doc('calendar', 'v3')
+    assert doc is not None, 'Calendar discovery document not found'
+    return json.loads(doc)
+
+
+# building a service fills in defaults in the shared discovery document, so builds mustn't run concurrently
+_build_lock = threading.Lock()
+
+
+class CalendarSession:
+    """Long-lived authenticated Calendar service, built once and reused for every poll.
+
+    Services are built from the discovery document shared by every session, and requests go through the shared,
+    pooled HTTP client, so each additional session (e.g. for another user) only costs its credentials.
+    """
+
+    # refresh credentials when they're this close to expiry
+    refresh_margin = timedelta(minutes=5)
+
+    def __init__(self, creds: Credentials, token_file: Path):
+        self._creds = creds
+        self._token_file = token_file
+        http = AuthorizedHttp(creds, http=Httplib2Adapter())
+        with _build_lock:
+            self.service: Service = build_from_document(
+                calendar_document(), http=http, client_options={'api_endpoint': get_settings().calendar_api_url}
+            )
+
+    @classmethod
+    def connect(
+        cls, allow_auth_flow: bool, token_file: Path = Path('calendar-temporary-auth-token.json')
+    ) -> CalendarSession:
+        with span('calendar_auth'):
+            creds = authenticate_google_calendar(allow_auth_flow, token_file)
+        return cls(creds, token_file)
+
+    def refresh_if_needed(self) -> None:
+        """Refresh credentials in place, but only if they're close to expiry."""
+        # google-auth uses naive UTC datetimes for expiry
+        expiry: datetime | None = self._creds.expiry
+        now = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        if self._creds.token is None or (expiry is not None and expiry - now < self.refresh_margin):
+            with span('calendar_token_refresh'):
+                self._creds.refresh(google_auth_request())
+            self._token_file.write_text(self._creds.to_json())
+
+
+def authenticate_google_calendar(allow_auth_flow: bool, token_file: Path) -> Credentials:
+    """Authenticate and return Google Calendar credentials."""
     creds = None
-    # The file token.json stores the user's access and refresh tokens.
-    token_file = Path('calendar-temporary-auth-token.json')
+    # The token file stores the user's access and refresh tokens.
     if token_file.exists():
         creds = Credentials.from_authorized_user_file(str(token_file), SCOPES)
 
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
-            creds.refresh(GoogleRequest())
+            creds.refresh(google_auth_request())
         elif allow_auth_flow:
+            # only imported when needed since it's slow to import
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
             flow = InstalledAppFlow.from_client_secrets_file('calendar-auth-credentials.json', SCOPES)
             creds = flow.run_local_server(
                 port=9000,
                 authorization_prompt_message='Please visit this URL to authorize Google Calendar:\n\n{url}',
             )
+            # the installed app flow always gives user credentials
+            assert isinstance(creds, Credentials)
         else:
             raise RuntimeError('No valid credentials found, and auth flow disabled')
 
         token_file.write_text(creds.to_json())
 
-    return build_calendar_service('calendar', 'v3', credentials=creds)
+    return creds
 
 
 def get_upcoming_appointments(
     service: Service, min_datetime: datetime, *, max_results: int = 100, calendar_id: str = 'primary'
-) -> list[dict[str, Any]]:
+) -> list[AllDayCalEvent | TimeRangeCalEvent]:
     """Fetch upcoming appointments from Google Calendar."""
 
     # Call the Calendar API
-    return (
-        service.events()
-        .list(
-            calendarId=calendar_id,
-            timeMin=rfc3339(min_datetime),
-            timeMax=rfc3339(min_datetime + timedelta(days=2)),
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy='startTime',
-        )
-        .execute()
-        .get('items', [])
+    request = service.events().list(
+        calendarId=calendar_id,
+        timeMin=rfc3339(min_datetime),
+        timeMax=rfc3339(min_datetime + timedelta(days=2)),
+        maxResults=max_results,
+        singleEvents=True,
+        orderBy='startTime',
+        fields=page_fields,
     )
+    page = fetch_page(request)
+    return [event for event in page.items if not isinstance(event, CancelledEvent)]
 
 
 def rfc3339(dt: datetime) -> str:
@@ -129,9 +534,8 @@ def rfc3339(dt: datetime) -> str:
 if __name__ == '__main__':
     from devtools import debug
 
-    service = authenticate_google_calendar(True)
+    service = CalendarSession.connect(True).service
     # min_datetime = datetime.now(tz=timezone.utc) - timedelta(minutes=5)
     min_datetime = datetime.now(tz=timezone.utc) - timedelta(hours=6)
-    raw_events = get_upcoming_appointments(service, min_datetime)
-    events = events_schema.validate_python(raw_events)
+    events = get_upcoming_appointments(service, min_datetime)
     debug(events)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import threading
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from .calendar_get import CalendarSession, Service
+from .scheduler import Scheduler, Timer
+
+__all__ = 'CalendarPush', 'PushReceiver', 'WatchChannel', 'emulate_notification'
+
+logger = logging.getLogger('call_alert.push')
+
+
+@dataclass
+class WatchChannel:
+    id: str
+    token: str
+    resource_id: str
+    expiration: datetime
+
+    def live(self) -> bool:
+        return self.expiration > datetime.now(tz=timezone.utc)
+
+
+def watch_events(service: Service, address: str, *, ttl: timedelta, calendar_id: str = 'primary') -> WatchChannel:
+    """Register a channel so Google pushes a notification to `address` whenever events change."""
+    channel_id = str(uuid.uuid4())
+    token = secrets.token_urlsafe(16)
+    response = (
+        service.events()
+        .watch(
+            calendarId=calendar_id,
+            body={
+                'id': channel_id,
+                'type': 'web_hook',
+                'address': address,
+                'token': token,
+                'params': {'ttl': str(int(ttl.total_seconds()))},
+            },
+        )
+        .execute()
+    )
+    expiration = datetime.fromtimestamp(int(response['expiration']) / 1000, tz=timezone.utc)
+    return WatchChannel(channel_id, token, response['resourceId'], expiration)
+
+
+def stop_channel(service: Service, channel: WatchChannel) -> None:
+    service.channels().stop(body={'id': channel.id, 'resourceId': channel.resource_id}).execute()
+
+
+class PushReceiver:
+    """Small local HTTP server which receives Calendar push notifications.
+
+    Google only delivers to a public HTTPS address, so this is expected to sit behind a tunnel or reverse proxy.
+    `on_notification` is called from the server thread for every valid "exists" notification.
+    """
+
+    def __init__(self, host: str, port: int, on_notification: Callable[[], None] | None = None):
+        self.on_notification = on_notification
+        # channel ID -> channel token
+        self.channels: dict[str, str] = {}
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                channel_id = self.headers.get('X-Goog-Channel-ID', '')
+                token = self.headers.get('X-Goog-Channel-Token')
+                state = self.headers.get('X-Goog-Resource-State')
+                self.send_response(200)
+                self.end_headers()
+                if state == 'sync':
+                    # sent when a channel is created, nothing has changed
+                    return
+                if receiver.channels.get(channel_id) != token:
+                    logger.warning('Ignoring push notification for unknown channel %r', channel_id)
+                elif state == 'exists' and receiver.on_notification:
+                    receiver.on_notification()
+
+            def log_message(self, format: str, *args: object) -> None:
+                logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='push-receiver', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host!s}:{port}/'
+
+    def start(self) -> None:
+        # the receiver is shared by every calendar's watch channel, so this may be called more than once
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def emulate_notification(url: str, channel: WatchChannel, *, state: str = 'exists', message_number: int = 1) -> None:
+    """Send the same request Google sends for a push notification, for testing without a public address."""
+    r = httpx.post(
+        url,
+        headers={
+            'X-Goog-Channel-ID': channel.id,
+            'X-Goog-Channel-Token': channel.token,
+            'X-Goog-Channel-Expiration': channel.expiration.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+            'X-Goog-Resource-ID': channel.resource_id,
+            'X-Goog-Resource-State': state,
+            'X-Goog-Message-Number': str(message_number),
+        },
+    )
+    r.raise_for_status()
+
+
+class CalendarPush:
+    """Keeps a calendar's watch channel registered and renewed, calling `on_change` on the event loop when events
+    change.
+
+    If registering or renewing a channel fails, the channel lapses and callers should fall back to polling,
+    renewal is retried every `retry_interval`.
+    """
+
+    # renew channels this long before they expire
+    renew_margin = timedelta(hours=1)
+    retry_interval = timedelta(minutes=10)
+
+    def __init__(
+        self,
+        session: CalendarSession,
+        scheduler: Scheduler,
+        receiver: PushReceiver,
+        address: str,
+        *,
+        ttl: timedelta,
+        on_change: Callable[[], None],
+        calendar_id: str = 'primary',
+    ):
+        self.session = session
+        self.scheduler = scheduler
+        self.receiver = receiver
+        self.address = address
+        self.ttl = ttl
+        self.on_change = on_change
+        self.calendar_id = calendar_id
+        self.channel: WatchChannel | None = None
+        self._renew_timer: Timer | None = None
+        self._lapse_timer: Timer | None = None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        def on_notification() -> None:
+            # notifications arrive on the receiver's thread, hand them to the event loop
+            loop.call_soon_threadsafe(self.on_change)
+
+        self.receiver.on_notification = on_notification
+        self.receiver.start()
+        self._renew_timer = self.scheduler.call_later(timedelta(), 'watch channel', self.renew)
+
+    @property
+    def live(self) -> bool:
+        return self.channel is not None and self.channel.live()
+
+    async def renew(self) -> None:
+        old_channel = self.channel
+        try:
+            channel = await asyncio.to_thread(
+                watch_events, self.session.service, self.address, ttl=self.ttl, calendar_id=self.calendar_id
+            )
+        except Exception as e:
+            logger.warning('Error registering watch channel for %r, falling back to polling: %s', self.calendar_id, e)
+            self._renew_timer = self.scheduler.call_later(self.retry_interval, 'watch channel', self.renew)
+            return
+
+        self.receiver.channels[channel.id] = channel.token
+        self.channel = channel
+        logger.info('Watch channel %s for %r registered until %s', channel.id, self.calendar_id, channel.expiration)
+        self._renew_timer = self.scheduler.call_at(channel.expiration - self.renew_margin, 'watch channel', self.renew)
+        if self._lapse_timer:
+            self._lapse_timer.cancel()
+        self._lapse_timer = self.scheduler.call_at(channel.expiration, 'watch channel lapsed', self._lapsed)
+        if old_channel is not None:
+            await self._stop_channel(old_channel)
+
+    async def _lapsed(self) -> None:
+        logger.warning('Watch channel for %r lapsed, falling back to polling', self.calendar_id)
+        # polling now means the next poll is scheduled with the shorter interval used without push
+        self.on_change()
+
+    async def stop(self) -> None:
+        for timer in self._renew_timer, self._lapse_timer:
+            if timer:
+                timer.cancel()
+        if self.channel is not None:
+            await self._stop_channel(self.channel)
+        self.receiver.stop()
+
+    async def _stop_channel(self, channel: WatchChannel) -> None:
+        self.receiver.channels.pop(channel.id, None)
+        try:
+            await asyncio.to_thread(stop_channel, self.session.service, channel)
+        except Exception as e:
+            logger.warning('Error stopping calendar watch channel %s: %s', channel.id, e)
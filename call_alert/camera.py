@@ -1,5 +1,6 @@
 import struct
-from typing import TYPE_CHECKING
+from functools import cache
+from typing import TYPE_CHECKING, cast
 
 if TYPE_CHECKING:
 
@@ -21,26 +22,45 @@ if TYPE_CHECKING:
         def devicesWithMediaType_(cls, _: AVMediaTypeVideo) -> list[Camera]: ...
 
 
-else:
-    import CoreMediaIO
-    from AVFoundation import AVCaptureDevice, AVMediaTypeVideo
+@cache
+def _frameworks() -> tuple[type['CoreMediaIO'], type['AVCaptureDevice'], 'AVMediaTypeVideo']:
+    """PyObjC frameworks are slow to import, so they're only imported when the camera is first checked."""
+    import CoreMediaIO as core_media_io  # type: ignore
+    from AVFoundation import (  # type: ignore
+        AVCaptureDevice as av_capture_device,  # type: ignore
+        AVMediaTypeVideo as av_media_type_video,  # type: ignore
+    )
 
+    return (
+        cast('type[CoreMediaIO]', core_media_io),
+        cast('type[AVCaptureDevice]', av_capture_device),
+        cast('AVMediaTypeVideo', av_media_type_video),
+    )
 
-def camera_active() -> bool:
-    property_address = CoreMediaIO.CMIOObjectPropertyAddress(CoreMediaIO.kCMIODevicePropertyDeviceIsRunningSomewhere)
 
-    for camera in AVCaptureDevice.devicesWithMediaType_(AVMediaTypeVideo):
-        result = CoreMediaIO.CMIOObjectGetPropertyData(
-            camera.connectionID(),
-            property_address,
-            0,
-            None,
-            struct.calcsize('I'),
-            None,
-            None,
-        )
-        raw = result[3]
-        if result[0] == 0 and isinstance(raw, bytes) and struct.unpack('I', raw[:4])[0]:
-            return True
+def list_cameras() -> list['Camera']:
+    _, av_capture_device, av_media_type_video = _frameworks()
+    return av_capture_device.devicesWithMediaType_(av_media_type_video)
 
-    return False
+
+def camera_running(camera: 'Camera') -> bool:
+    """Whether the camera is being used by any process."""
+    core_media_io, _, _ = _frameworks()
+    property_address = core_media_io.CMIOObjectPropertyAddress(
+        core_media_io.kCMIODevicePropertyDeviceIsRunningSomewhere
+    )
+    result = core_media_io.CMIOObjectGetPropertyData(
+        camera.connectionID(),
+        property_address,
+        0,
+        None,
+        struct.calcsize('I'),
+        None,
+        None,
+    )
+    raw = result[3]
+    return result[0] == 0 and isinstance(raw, bytes) and bool(struct.unpack('I', raw[:4])[0])
+
+
+def camera_active(cameras: list['Camera'] | None = None) -> bool:
+    return any(camera_running(camera) for camera in (list_cameras() if cameras is None else cameras))
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any
+
+import google_auth_httplib2  # pyright: ignore[reportMissingTypeStubs]
+import httplib2
+import httpx
+
+from .metrics import incr
+from .settings import get_settings
+
+__all__ = 'Httplib2Adapter', 'close_client', 'get_client', 'google_auth_request', 'request'
+
+logger = logging.getLogger('call_alert.http')
+
+# status codes which are worth retrying
+retry_statuses = {429, 500, 502, 503, 504}
+# Google APIs only compress responses when the user agent contains "gzip", as well as the accept-encoding header
+user_agent = 'call-alert (gzip)'
+
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    """Process-wide pooled HTTP client, shared by TTS and Calendar requests so connections are reused."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings = get_settings()
+                _client = httpx.Client(
+                    http2=settings.http2,
+                    timeout=settings.http_timeout,
+                    headers={'User-Agent': user_agent},
+                    # retries here only cover failing to connect, `request` also retries some error responses
+                    transport=httpx.HTTPTransport(http2=settings.http2, retries=settings.http_retries),
+                    limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=300),
+                )
+    return _client
+
+
+def close_client() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def request(method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Make a request with the shared client, retrying transport errors and retryable statuses with backoff."""
+    retries = get_settings().http_retries
+    for attempt in range(retries + 1):
+        try:
+            r = get_client().request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise
+            logger.warning('%s %s failed: %r, retrying', method, url, e)
+            incr('http_retries_total', reason=type(e).__name__)
+        else:
+            if r.status_code not in retry_statuses or attempt == retries:
+                return r
+            logger.warning('%s %s returned %d, retrying', method, url, r.status_code)
+            incr('http_retries_total', reason=str(r.status_code))
+        time.sleep(0.5 * 2**attempt)
+    raise AssertionError('unreachable')
+
+
+class Httplib2Adapter:
+    """Minimal stand-in for `httplib2.Http` so googleapiclient requests go through the shared httpx client.
+
+    Wrap it in `google_auth_httplib2.AuthorizedHttp` to add credentials.
+    """
+
+    def request(
+        self,
+        uri: str,
+        method: str = 'GET',
+        body: bytes | str | None = None,
+        headers: dict[str, str] | None = None,
+        redirections: int = 5,
+        connection_type: object = None,  # pyright: ignore[reportUnusedParameter] part of httplib2's signature
+        **_: Any,
+    ) -> tuple[httplib2.Response, bytes]:
+        r = request(method, uri, content=body, headers=headers, follow_redirects=redirections > 0)
+        # httpx has already decoded the body, so the encoding headers no longer apply
+        response_headers = {
+            k: v for k, v in r.headers.items() if k.lower() not in {'content-encoding', 'content-length'}
+        }
+        response = httplib2.Response({**response_headers, 'status': str(r.status_code)})
+        response.reason = r.reason_phrase
+        return response, r.content
+
+    def close(self) -> None:
+        # the shared client is closed by `close_client`
+        pass
+
+
+def google_auth_request() -> google_auth_httplib2.Request:
+    """Transport for refreshing google-auth credentials through the shared client.
+
+    This also avoids importing `google.auth.transport.requests` and `requests`, which are slow to import.
+    """
+    return google_auth_httplib2.Request(Httplib2Adapter())
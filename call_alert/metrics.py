@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import threading
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TextIO
+
+__all__ = 'Metrics', 'MetricsServer', 'incr', 'metrics', 'observe', 'set_gauge', 'span', 'start_metrics'
+
+logger = logging.getLogger('call_alert.metrics')
+
+prefix = 'call_alert_'
+# histogram buckets in seconds, suitable for everything from presence checks to speech synthesis
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list[int])
+    sum: float = 0
+    count: int = 0
+
+    def __post_init__(self):
+        self.counts = [0] * len(self.buckets)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """In-process counters, gauges and histograms, exposed in the Prometheus text format by `render`.
+
+    If `sink` is set, every update is also written to it as a JSON line.
+    """
+
+    def __init__(self):
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.gauges: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.sink: TextIO | None = None
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: float = 1, /, **labels: str) -> None:
+        key = name, label_key(labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._emit('counter', name, labels, amount)
+
+    def set_gauge(self, name: str, value: float, /, **labels: str) -> None:
+        with self._lock:
+            self.gauges[name, label_key(labels)] = value
+            self._emit('gauge', name, labels, value)
+
+    def observe(self, name: str, value: float, /, **labels: str) -> None:
+        key = name, label_key(labels)
+        with self._lock:
+            if (histogram := self.histograms.get(key)) is None:
+                histogram = self.histograms[key] = Histogram(default_buckets)
+            histogram.observe(value)
+            self._emit('histogram', name, labels, value)
+
+    @contextmanager
+    def span(self, name: str, /, **labels: str) -> Generator[None]:
+        """Time a block as `span_seconds{span=name}`, counting exceptions as `errors_total{span=name}`."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.incr('errors_total', span=name, **labels)
+            raise
+        finally:
+            self.observe('span_seconds', time.perf_counter() - start, span=name, **labels)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for kind, values in ('counter', self.counters), ('gauge', self.gauges):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f'# TYPE {prefix}{name} {kind}')
+                    for (n, labels), value in sorted(values.items()):
+                        if n == name:
+                            lines.append(f'{prefix}{name}{format_labels(labels)} {value:g}')
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f'# TYPE {prefix}{name} histogram')
+                for (n, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bucket, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = format_labels((*labels, ('le', f'{bucket:g}')))
+                        lines.append(f'{prefix}{name}_bucket{le} {cumulative}')
+                    le = format_labels((*labels, ('le', '+Inf')))
+                    lines.append(f'{prefix}{name}_bucket{le} {histogram.count}')
+                    lines.append(f'{prefix}{name}_sum{format_labels(labels)} {histogram.sum:g}')
+                    lines.append(f'{prefix}{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def _emit(self, kind: str, name: str, labels: dict[str, str], value: float) -> None:
+        if self.sink is None:
+            return
+        line: dict[str, object] = {
+            'time': datetime.now(tz=timezone.utc).isoformat(),
+            'type': kind,
+            'metric': f'{prefix}{name}',
+            'labels': labels,
+            'value': value,
+        }
+        self.sink.write(json.dumps(line) + '\n')
+        self.sink.flush()
+
+
+def label_key(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels) + '}'
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsServer:
+    """Serves `metrics` in the Prometheus text format at `/metrics`."""
+
+    def __init__(self, host: str, port: int, registry: Metrics):
+        # imported here so the server's dependencies aren't imported when metrics aren't served
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host!s}:{port}/metrics'
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+metrics = Metrics()
+incr = metrics.incr
+set_gauge = metrics.set_gauge
+observe = metrics.observe
+span = metrics.span
+
+
+def start_metrics(host: str, port: int | None, jsonl_file: Path | None) -> MetricsServer | None:
+    """Start the metrics endpoint if `port` is set, and the JSON lines sink if `jsonl_file` is set."""
+    if jsonl_file:
+        metrics.sink = jsonl_file.open('a')
+    if port is None:
+        return None
+    server = MetricsServer(host, port, metrics)
+    server.start()
+    logger.info('Serving metrics at %s', server.url)
+    return server
@@ -1,13 +1,205 @@
+from __future__ import annotations
+
+import logging
+import queue
 import subprocess
-from typing import Literal
-
-
-def notify(
-    title: str, message: str, *, link: str | None = None, sound: Literal['default', 'error'] | None = None
-) -> None:
-    args = ['terminal-notifier', '-message', message, '-title', title]
-    if link:
-        args += ['-open', link]
-    if sound:
-        args += ['-sound', sound]
-    subprocess.run(args, check=True)
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from functools import cache
+from typing import TYPE_CHECKING, Literal
+
+from .metrics import incr, observe, span
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    from jeepney.io.blocking import DBusConnection
+
+__all__ = (
+    'DBusBackend',
+    'InMemoryBackend',
+    'Notification',
+    'NotificationBackend',
+    'NotificationDispatcher',
+    'TerminalNotifierBackend',
+    'dispatcher_for',
+    'flush_notifications',
+    'get_dispatcher',
+    'notify',
+)
+
+logger = logging.getLogger('call_alert.notification')
+
+Sound = Literal['default', 'error']
+BackendName = Literal['auto', 'terminal-notifier', 'dbus', 'memory']
+
+
+def notify(title: str, message: str, *, link: str | None = None, sound: Sound | None = None) -> None:
+    """Queue a notification, this never blocks on the notification being shown."""
+    get_dispatcher().notify(title, message, link=link, sound=sound)
+
+
+def flush_notifications(timeout: float = 5) -> bool:
+    """Wait for queued notifications to be delivered, e.g. before exiting."""
+    return get_dispatcher().flush(timeout)
+
+
+@dataclass
+class Notification:
+    title: str
+    message: str
+    link: str | None = None
+    sound: Sound | None = None
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class NotificationBackend(ABC):
+    @abstractmethod
+    def send(self, notification: Notification) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class TerminalNotifierBackend(NotificationBackend):
+    """macOS notifications via `terminal-notifier`."""
+
+    def send(self, notification: Notification) -> None:
+        args = ['terminal-notifier', '-message', notification.message, '-title', notification.title]
+        if notification.link:
+            args += ['-open', notification.link]
+        if notification.sound:
+            args += ['-sound', notification.sound]
+        subprocess.run(args, check=True)
+
+
+class DBusBackend(NotificationBackend):
+    """Linux notifications via `org.freedesktop.Notifications`, over one long-lived session bus connection.
+
+    `bus` is the session bus address, e.g. `unix:path=/run/user/1000/bus` to reach another user's desktop, by default
+    the current session's bus is used.
+    """
+
+    def __init__(self, app_name: str = 'Call Alert', *, bus: str = 'SESSION'):
+        from jeepney import DBusAddress
+
+        self.app_name = app_name
+        self.bus = bus
+        self._address = DBusAddress(
+            '/org/freedesktop/Notifications',
+            bus_name='org.freedesktop.Notifications',
+            interface='org.freedesktop.Notifications',
+        )
+        self._connection: DBusConnection | None = None
+
+    def send(self, notification: Notification) -> None:
+        from jeepney import new_method_call
+        from jeepney.io.blocking import open_dbus_connection
+        from jeepney.wrappers import unwrap_msg
+
+        body = notification.message
+        if notification.link:
+            body += f'\n{notification.link}'
+        hints: dict[str, tuple[str, object]] = {}
+        if notification.sound == 'error':
+            hints['urgency'] = ('y', 2)
+            hints['sound-name'] = ('s', 'dialog-error')
+        elif notification.sound:
+            hints['sound-name'] = ('s', 'message-new-instant')
+
+        message = new_method_call(
+            self._address,
+            'Notify',
+            'susssasa{sv}i',
+            (self.app_name, 0, '', notification.title, body, [], hints, -1),
+        )
+        if self._connection is None:
+            self._connection = open_dbus_connection(bus=self.bus)
+        try:
+            unwrap_msg(self._connection.send_and_get_reply(message, timeout=5))
+        except Exception:
+            # reconnect next time in case the bus connection has gone away
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class InMemoryBackend(NotificationBackend):
+    """Records notifications rather than showing them, for tests."""
+
+    def __init__(self):
+        self.sent: list[Notification] = []
+
+    def send(self, notification: Notification) -> None:
+        self.sent.append(notification)
+
+
+class NotificationDispatcher:
+    """Delivers notifications from a bounded queue on a worker thread so callers never block.
+
+    If the queue is full, new notifications are dropped with a warning. The time from queueing to delivery of recent
+    notifications is kept in `latencies`.
+    """
+
+    def __init__(self, backend: NotificationBackend, *, max_queue: int = 20):
+        self.backend = backend
+        self.latencies: deque[float] = deque(maxlen=100)
+        self._queue: queue.Queue[Notification] = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='notifications', daemon=True)
+        self._thread.start()
+
+    def notify(self, title: str, message: str, *, link: str | None = None, sound: Sound | None = None) -> None:
+        try:
+            self._queue.put_nowait(Notification(title, message, link, sound))
+        except queue.Full:
+            logger.warning('Notification queue full, dropping notification %r', title)
+            incr('notifications_dropped_total')
+
+    def flush(self, timeout: float) -> bool:
+        """Wait until all queued notifications have been handled, returns False on timeout."""
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def _run(self) -> None:
+        while True:
+            notification = self._queue.get()
+            try:
+                with span('notify', backend=type(self.backend).__name__):
+                    self.backend.send(notification)
+            except Exception:
+                logger.exception('Error sending notification %r', notification.title)
+            else:
+                latency = time.perf_counter() - notification.queued_at
+                self.latencies.append(latency)
+                observe('notification_latency_seconds', latency)
+                logger.debug('Notification %r delivered in %0.3fs', notification.title, latency)
+            finally:
+                self._queue.task_done()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    return dispatcher_for(get_settings().notification_backend)
+
+
+@cache
+def dispatcher_for(backend_name: BackendName, dbus_address: str | None = None) -> NotificationDispatcher:
+    """Dispatcher for a backend, users whose notifications go to the same place share a dispatcher."""
+    if backend_name == 'auto':
+        backend_name = 'dbus' if sys.platform == 'linux' else 'terminal-notifier'
+
+    backend: NotificationBackend
+    if backend_name == 'dbus':
+        backend = DBusBackend(bus=dbus_address or 'SESSION')
+    elif backend_name == 'memory':
+        backend = InMemoryBackend()
+    else:
+        backend = TerminalNotifierBackend()
+    return NotificationDispatcher(backend, max_queue=get_settings().notification_queue)
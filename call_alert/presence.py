@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    from .camera import Camera
+
+__all__ = (
+    'CachedPresence',
+    'LinuxDevicePresence',
+    'MacCameraPresence',
+    'NoPresence',
+    'PresenceDetector',
+    'get_detector',
+)
+
+logger = logging.getLogger('call_alert.presence')
+
+
+class PresenceDetector(ABC):
+    """Detects whether the user is already in a call, in which case alerts are skipped."""
+
+    @abstractmethod
+    def active(self) -> bool:
+        raise NotImplementedError
+
+
+class CachedPresence(PresenceDetector):
+    """Caches another detector's result for `ttl` seconds so repeated checks are cheap."""
+
+    def __init__(self, detector: PresenceDetector, ttl: float):
+        self.detector = detector
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._result: tuple[float, bool] | None = None
+
+    def active(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._result[0] > self.ttl:
+                self._result = now, self.detector.active()
+            return self._result[1]
+
+
+class MacCameraPresence(PresenceDetector):
+    """Checks whether any camera is in use via CoreMediaIO, the device list is cached for `device_ttl` seconds."""
+
+    def __init__(self, device_ttl: float = 60):
+        self.device_ttl = device_ttl
+        self._cameras: tuple[float, list[Camera]] | None = None
+
+    def active(self) -> bool:
+        from .camera import camera_active, list_cameras
+
+        now = time.monotonic()
+        if self._cameras is None or now - self._cameras[0] > self.device_ttl:
+            self._cameras = now, list_cameras()
+        return camera_active(self._cameras[1])
+
+
+class LinuxDevicePresence(PresenceDetector):
+    """Checks whether any process has a camera (and optionally a microphone) open by scanning `/proc/*/fd`.
+
+    The scan is incremental: processes which had a device open last time are checked first, and processes whose
+    file descriptors can't be read (e.g. other users' processes) or which are kernel threads are remembered and
+    skipped on later scans. `root` can point at a fake filesystem for testing.
+    """
+
+    def __init__(self, *, microphones: bool = False, root: Path = Path('/')):
+        self.microphones = microphones
+        self.proc = root / 'proc'
+        self._holders: list[str] = []
+        self._skip: set[str] = set()
+
+    def active(self) -> bool:
+        for pid in self._holders:
+            if self._has_device(pid):
+                return True
+
+        pids = {entry.name for entry in os.scandir(self.proc) if entry.name.isdigit()}
+        # forget processes which have exited so their PIDs can be checked if they're reused
+        self._skip &= pids
+        self._holders = [pid for pid in pids - self._skip if self._has_device(pid)]
+        return bool(self._holders)
+
+    def _has_device(self, pid: str) -> bool:
+        fd_dir = self.proc / pid / 'fd'
+        try:
+            fds = os.scandir(fd_dir)
+        except PermissionError:
+            self._skip.add(pid)
+            return False
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+        with fds:
+            empty = True
+            for fd in fds:
+                empty = False
+                try:
+                    target = os.readlink(fd.path)
+                except OSError:
+                    continue
+                if self._is_device(target):
+                    return True
+
+        if empty and self._kernel_thread(pid):
+            self._skip.add(pid)
+        return False
+
+    def _is_device(self, target: str) -> bool:
+        if target.startswith('/dev/video'):
+            return True
+        # capture PCM devices look like /dev/snd/pcmC0D0c
+        return self.microphones and target.startswith('/dev/snd/pcmC') and target.endswith('c')
+
+    def _kernel_thread(self, pid: str) -> bool:
+        try:
+            return (self.proc / pid / 'cmdline').read_bytes() == b''
+        except OSError:
+            return False
+
+
+class NoPresence(PresenceDetector):
+    """Used on platforms without a backend, alerts are never skipped."""
+
+    def active(self) -> bool:
+        return False
+
+
+@cache
+def get_detector() -> PresenceDetector:
+    """Process-wide detector for the current platform, results are cached for `presence_ttl`."""
+    settings = get_settings()
+    detector: PresenceDetector
+    if sys.platform == 'darwin':
+        detector = MacCameraPresence()
+    elif sys.platform == 'linux':
+        detector = LinuxDevicePresence(microphones=settings.presence_microphones)
+    else:
+        logger.warning('No presence detection available on %s, alerts will never be skipped', sys.platform)
+        detector = NoPresence()
+    return CachedPresence(detector, settings.presence_ttl.total_seconds())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections.abc import Callable, Coroutine
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from .metrics import incr
+
+__all__ = 'Scheduler', 'Timer'
+
+logger = logging.getLogger('call_alert.scheduler')
+
+Callback = Callable[[], Coroutine[Any, Any, None]]
+
+
+class Timer:
+    """Handle for a callback registered with `Scheduler.call_at`."""
+
+    __slots__ = 'when', 'name', 'callback', 'cancelled'
+
+    def __init__(self, when: datetime, name: str, callback: Callback):
+        self.when = when
+        self.name = name
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def __repr__(self) -> str:
+        return f'<Timer {self.name!r} at {self.when}{" cancelled" if self.cancelled else ""}>'
+
+
+class Scheduler:
+    """Runs async callbacks at wall-clock times, all timers live on a single heap.
+
+    Each due callback runs as its own task so a long running callback (e.g. an alert sequence) never delays other
+    timers. By default an exception in any callback stops the scheduler and is raised from `run`, with
+    `stop_on_error=False` exceptions are logged and other timers carry on.
+    """
+
+    # never wait longer than this in one go, so changes to the wall clock (e.g. after the machine sleeps) are noticed
+    max_wait = timedelta(seconds=30)
+
+    def __init__(self, *, stop_on_error: bool = True):
+        self.stop_on_error = stop_on_error
+        self._heap: list[tuple[float, int, Timer]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._failure: BaseException | None = None
+
+    def call_at(self, when: datetime, name: str, callback: Callback) -> Timer:
+        timer = Timer(when, name, callback)
+        heapq.heappush(self._heap, (when.timestamp(), next(self._counter), timer))
+        self._wakeup.set()
+        return timer
+
+    def call_later(self, delay: timedelta, name: str, callback: Callback) -> Timer:
+        return self.call_at(datetime.now(tz=timezone.utc) + delay, name, callback)
+
+    async def run(self) -> None:
+        try:
+            while self._failure is None:
+                now = datetime.now(tz=timezone.utc).timestamp()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, timer = heapq.heappop(self._heap)
+                    if not timer.cancelled:
+                        self._start(timer)
+
+                self._wakeup.clear()
+                timeout = self.max_wait.total_seconds()
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - now)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    pass
+            raise self._failure
+        finally:
+            for task in self._tasks:
+                task.cancel()
+
+    def _start(self, timer: Timer) -> None:
+        lateness = datetime.now(tz=timezone.utc) - timer.when
+        logger.debug('Running %s, %0.3fs late', timer, lateness.total_seconds())
+        task = asyncio.create_task(timer.callback(), name=timer.name)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task[None]) -> None:
+        self._tasks.discard(task)
+        if task.cancelled() or (exc := task.exception()) is None:
+            return
+        if not self.stop_on_error:
+            logger.error('Error running %s', task.get_name(), exc_info=exc)
+            incr('task_errors_total')
+        elif self._failure is None:
+            self._failure = exc
+            self._wakeup.set()
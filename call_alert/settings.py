@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import os
+from datetime import timedelta
+from functools import cache
+from pathlib import Path
+from typing import Annotated, Any, Literal
+
+from pydantic import BaseModel, BeforeValidator
+
+__all__ = 'Settings', 'get_settings'
+
+env_prefix = 'CALL_ALERT_'
+
+
+def split_comma(value: Any) -> Any:
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return value
+
+
+# lists are set in environment variables as comma separated values
+CommaList = Annotated[list[str], BeforeValidator(split_comma)]
+
+
+class Settings(BaseModel):
+    """Call alert configuration, every field can be set with an upper case environment variable prefixed with
+    `CALL_ALERT_`, e.g. `CALL_ALERT_PRERENDER_LEAD=PT5M`.
+    """
+
+    # calendars to alert on, when an event is in more than one calendar, the first calendar listed wins
+    calendar_ids: CommaList = ['primary']
+    # how many calendars are fetched at once
+    calendar_concurrency: int = 4
+
+    # polling backs off from the minimum to the maximum interval the longer the calendar goes unchanged, and
+    # tightens again as the next call approaches
+    poll_min_interval: timedelta = timedelta(minutes=1)
+    poll_max_interval: timedelta = timedelta(minutes=20)
+
+    # how long before an event starts to synthesize its alerts and refresh tokens
+    prerender_lead: timedelta = timedelta(minutes=2)
+
+    # how long to cache whether the camera is in use
+    presence_ttl: timedelta = timedelta(seconds=2)
+    # on Linux, also count a microphone being in use as being in a call
+    presence_microphones: bool = False
+
+    # deadlines for each stage of an alert, if the presence check is slow the alert is given anyway, if synthesis is
+    # slow only the notification is shown
+    alert_presence_timeout: timedelta = timedelta(seconds=2)
+    alert_speech_timeout: timedelta = timedelta(seconds=15)
+    # segments of speech not synthesized within this use the offline voice, if there is one
+    alert_speech_fallback_after: timedelta = timedelta(seconds=3)
+    # after this many TTS failures in a row, requests are skipped for `tts_breaker_reset` so alerts fall back straight
+    # away rather than waiting on a failing API
+    tts_breaker_failures: int = 3
+    tts_breaker_reset: timedelta = timedelta(minutes=1)
+
+    # serve Prometheus metrics at http://<metrics_host>:<metrics_port>/metrics, disabled if the port is not set
+    metrics_host: str = '127.0.0.1'
+    metrics_port: int | None = None
+    # also append every metric update to this file as JSON lines
+    metrics_jsonl: Path | None = None
+
+    # API base URLs, can be changed to point at local stand-ins, see `benchmarks/fake_servers.py`
+    calendar_api_url: str = 'https://www.googleapis.com/calendar/v3/'
+    tts_api_url: str = 'https://texttospeech.googleapis.com/v1beta1/'
+
+    # shared HTTP client used for all Google API requests
+    http2: bool = True
+    http_timeout: float = 10
+    http_retries: int = 2
+
+    # public HTTPS address which forwards to the push receiver, push updates are disabled if this is not set
+    push_address: str | None = None
+    # where the local push receiver listens
+    push_host: str = '127.0.0.1'
+    push_port: int = 8765
+    # how long watch channels are requested for, they're renewed before they expire
+    push_ttl: timedelta = timedelta(days=1)
+    # how often to poll while a watch channel is live, as a backstop in case notifications are lost
+    push_poll_interval: timedelta = timedelta(minutes=30)
+
+    # encoding requested from the TTS API, OGG_OPUS and MP3 are roughly a tenth the size of LINEAR16 (uncompressed
+    # WAV), OGG_OPUS can't be played by playsound so needs the `audio` extra
+    tts_encoding: Literal['OGG_OPUS', 'MP3', 'LINEAR16'] = 'MP3'
+    # how speech is played, "auto" decodes in-process and streams to an output kept open between clips if the
+    # `audio` extra is installed, and uses playsound otherwise
+    audio_output: Literal['auto', 'stream', 'playsound'] = 'auto'
+
+    # how notifications are shown, "auto" uses D-Bus on Linux and terminal-notifier elsewhere
+    notification_backend: Literal['auto', 'terminal-notifier', 'dbus', 'memory'] = 'auto'
+    # notifications queued beyond this are dropped rather than delaying alerts
+    notification_queue: int = 20
+
+    @classmethod
+    def from_env(cls) -> Settings:
+        values = {
+            name: os.environ[env_name]
+            for name in cls.model_fields
+            if (env_name := f'{env_prefix}{name.upper()}') in os.environ
+        }
+        return cls.model_validate_strings(values)
+
+
+@cache
+def get_settings() -> Settings:
+    return Settings.from_env()
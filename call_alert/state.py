@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+__all__ = 'StateStore', 'state_file'
+
+logger = logging.getLogger('call_alert.state')
+
+state_file = Path('call-alert-state.db')
+# alerts fired longer ago than this are dropped from the log
+fired_retention = timedelta(days=2)
+
+schema = """
+create table if not exists calendars (
+    calendar_id text primary key,
+    store text not null
+);
+create table if not exists alerts_fired (
+    event_id text not null,
+    start text not null,
+    offset_seconds integer not null,
+    fired_at text not null,
+    outcome text not null,
+    primary key (event_id, start, offset_seconds)
+);
+"""
+
+
+class StateStore:
+    """Durable state in SQLite, so a restarted daemon can carry on alerting straight away.
+
+    Holds each calendar's event window (as `CalendarStore` JSON) and a log of the alerts which have been given or
+    skipped. Pending alerts aren't stored since they're derived from the event window, less any already in the log.
+    Writes are single statements or transactions, so a crash never leaves partial state.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: Path = state_file) -> StateStore:
+        # the store is written from calendar fetch threads and the event loop, `_lock` serializes access
+        connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        connection.execute('pragma journal_mode = wal')
+        connection.execute('pragma synchronous = normal')
+        connection.executescript(schema)
+        return cls(connection)
+
+    @classmethod
+    def in_memory(cls) -> StateStore:
+        return cls.open(Path(':memory:'))
+
+    def calendars(self) -> dict[str, str]:
+        """Stored calendars' JSON by calendar ID."""
+        with self._lock:
+            return dict(self._connection.execute('select calendar_id, store from calendars').fetchall())
+
+    def save_calendars(self, calendars: dict[str, str]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute('begin')
+            self._connection.executemany(
+                'insert into calendars (calendar_id, store) values (?, ?) '
+                'on conflict (calendar_id) do update set store = excluded.store',
+                calendars.items(),
+            )
+
+    def record_alert(self, event_id: str, start: datetime, offset: timedelta, outcome: str, fired_at: datetime) -> None:
+        with self._lock:
+            self._connection.execute(
+                'insert or ignore into alerts_fired values (?, ?, ?, ?, ?)',
+                (event_id, start.isoformat(), int(offset.total_seconds()), fired_at.isoformat(), outcome),
+            )
+
+    def fired_offsets(self, event_id: str, start: datetime) -> set[timedelta]:
+        """Offsets of the alerts already given (or skipped) for an event starting at `start`."""
+        with self._lock:
+            rows = self._connection.execute(
+                'select offset_seconds from alerts_fired where event_id = ? and start = ?',
+                (event_id, start.isoformat()),
+            ).fetchall()
+        return {timedelta(seconds=offset) for (offset,) in rows}
+
+    def prune_alerts(self, now: datetime) -> None:
+        with self._lock:
+            self._connection.execute(
+                'delete from alerts_fired where fired_at < ?', ((now - fired_retention).isoformat(),)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,91 +1,347 @@
+from __future__ import annotations
+
+import logging
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from tempfile import NamedTemporaryFile
-from typing import Literal
+from datetime import datetime, timedelta, timezone
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
-import httpx
-from google.auth.transport.requests import Request as GoogleAuthRequest
-from google.oauth2.service_account import Credentials
-from playsound import playsound  # type: ignore
 from pydantic import Base64Bytes, BaseModel, Field
 
+from . import http_client
+from .audio_cache import AudioCache
+from .audio_output import output_for
+from .metrics import incr, set_gauge, span
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
+
 google_auth_scopes = ['https://www.googleapis.com/auth/cloud-platform']
 
+logger = logging.getLogger('call_alert.tts')
 
-def play_text(text: str):
-    auth_token = get_auth_token()
+# `audioEncoding` is added from settings
+audio_config: dict[str, Any] = {
+    # https://cloud.google.com/text-to-speech/docs/audio-profiles
+    'effectsProfileId': ['large-home-entertainment-class-device'],
+    'pitch': 0,
+    'speakingRate': 1,
+    # fixed so every clip can be played on the same output stream
+    'sampleRateHertz': 24000,
+}
+encoding_suffixes = {'LINEAR16': '.wav', 'MP3': '.mp3', 'OGG_OPUS': '.ogg'}
+audio_cache = AudioCache(Path('tts-cache'))
+# shared by all synthesis so concurrent alerts can't start an unbounded number of requests
+tts_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tts')
+# requests run on their own pool so a request and its hedge can run while `synthesize` waits on them
+request_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tts-request')
+# when to hedge a request before enough latencies have been recorded to estimate the p95
+default_hedge_after = 2.0
+
+
+def play_segments(paths: list[Path], device: str | None = None) -> None:
+    """Play the segments of an utterance as one clip on `device`, see `AudioOutput.play_segments`."""
+    with span('playback'):
+        output_for(device).play_segments(paths)
+
+
+def start_segments(segments: list[str], voice: str | None = None) -> list[Future[Path]]:
+    """Start synthesizing each segment of an utterance concurrently, returns futures for their audio files in order.
+
+    Segments shared between utterances are synthesized once and then served from the cache, so usually only the
+    segments that vary need a request.
+    """
+    return [tts_executor.submit(synthesize, segment, voice) for segment in segments]
+
+
+def prepare_segments(segments: list[str], voice: str | None = None, device: str | None = None) -> None:
+    """Synthesize segments so they're in the cache and ready to play on `device` when needed."""
+    output = output_for(device)
+    for future in start_segments(segments, voice):
+        output.preload(future.result())
+
+
+def synthesize(text: str, voice_name: str | None = None) -> Path:
+    """Convert text to speech with the named voice (by default `default_voice`), returns the path of the audio file
+    in the cache.
 
-    # voice = random.choice(english_voices)
-    # print('voice chosen:', random_voice)
-    voice = Voice(name='en-GB-Chirp3-HD-Zephyr', language_code='en-GB')
+    Identical requests are served from `audio_cache` without calling the API.
+    """
+    # voice = random.choice(get_catalog().find(language='en-GB'))
+    # print('voice chosen:', voice)
+    voice = Voice.from_name(voice_name) if voice_name else default_voice
+    encoding = get_settings().tts_encoding
+    config = {**audio_config, 'audioEncoding': encoding}
+    suffix = encoding_suffixes[encoding]
 
+    cache_key = audio_cache.key(text, voice.name, voice.language_code, config)
+    if cached := audio_cache.get(cache_key, suffix):
+        logger.debug('TTS cache hit for %r, %s', text, audio_cache.stats)
+        incr('tts_cache_total', result='hit')
+        return cached
+
+    breaker = get_breaker()
+    if not breaker.allow():
+        incr('tts_circuit_rejected_total')
+        raise RuntimeError('TTS circuit open, not sending request')
     request_data = {
-        'audioConfig': {
-            'audioEncoding': 'LINEAR16',
-            # https://cloud.google.com/text-to-speech/docs/audio-profiles
-            'effectsProfileId': ['large-home-entertainment-class-device'],
-            'pitch': 0,
-            'speakingRate': 1,
-        },
+        'audioConfig': config,
         'input': {'text': text},
         'voice': {'languageCode': voice.language_code, 'name': voice.name},
     }
-    r = httpx.post(
-        'https://texttospeech.googleapis.com/v1beta1/text:synthesize',
-        json=request_data,
-        headers={'Authorization': f'Bearer {auth_token}'},
-    )
+    try:
+        audio = hedged_request(request_data)
+    except Exception:
+        breaker.failure()
+        raise
+    breaker.success()
+    logger.debug('TTS cache miss for %r, %s', text, audio_cache.stats)
+    incr('tts_cache_total', result='miss')
+    return audio_cache.put(cache_key, audio, suffix)
+
+
+def hedged_request(request_data: dict[str, Any]) -> bytes:
+    """Make a synthesis request, if there's no response within the p95 latency of recent requests a duplicate is
+    sent and whichever succeeds first is used.
+    """
+    futures = [request_executor.submit(request_audio, request_data)]
+    done, _ = wait(futures, timeout=request_latencies.percentile(0.95))
+    if not done:
+        incr('tts_hedged_total')
+        futures.append(request_executor.submit(request_audio, request_data))
+    error: Exception | None = None
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            futures.remove(future)
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+    assert error is not None
+    raise error
+
+
+class AudioResponse(BaseModel):
+    audio_content: Base64Bytes = Field(validation_alias='audioContent')
+
+
+def request_audio(request_data: dict[str, Any]) -> bytes:
+    auth_token = get_auth_token()
+    start = time.perf_counter()
+    with span('tts_synthesize'):
+        r = http_client.request(
+            'POST',
+            f'{get_settings().tts_api_url}text:synthesize',
+            json=request_data,
+            headers={'Authorization': f'Bearer {auth_token}'},
+        )
     if r.status_code != 200:
+        incr('errors_total', span='tts_synthesize')
         raise ValueError(f'Error synthesising text: {r.status_code}, body:\n{r.text}')
+    request_latencies.record(time.perf_counter() - start)
+    return AudioResponse.model_validate_json(r.content).audio_content
 
-    class AudioResponse(BaseModel):
-        audio_content: Base64Bytes = Field(validation_alias='audioContent')
 
-    response = AudioResponse.model_validate_json(r.content)
+class LatencyTracker:
+    """Latencies of the most recent `size` successful requests."""
 
-    with NamedTemporaryFile() as fp:
-        fp.write(response.audio_content)
-        fp.flush()
-        fp.seek(0)
-        playsound(fp.name)
+    def __init__(self, size: int = 100, *, min_samples: int = 20, default: float = default_hedge_after):
+        self.min_samples = min_samples
+        self.default = default
+        self._latencies: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
 
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
 
-def get_voices():
-    auth_token = get_auth_token()
+    def percentile(self, q: float) -> float:
+        """Latency at quantile `q`, or `default` until there are `min_samples` latencies."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default
+            latencies = sorted(self._latencies)
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
 
-    r = httpx.get(
-        'https://texttospeech.googleapis.com/v1beta1/voices',
-        headers={'Authorization': f'Bearer {auth_token}'},
-    )
-    if r.status_code != 200:
-        raise ValueError(f'Error getting voices: {r.status_code}, body:\n{r.text}')
 
-    class VoiceInfo(BaseModel):
-        language_codes: list[str] = Field(validation_alias='languageCodes')
-        name: str
-        ssml_gender: Literal['MALE', 'FEMALE'] = Field(validation_alias='ssmlGender')
-        natural_sample_rate_hertz: int = Field(validation_alias='naturalSampleRateHertz')
+request_latencies = LatencyTracker()
+
+
+class CircuitBreaker:
+    """Stops requests to a failing backend.
+
+    After `failures` failures in a row the circuit opens and requests are rejected straight away, after `reset_after`
+    one trial request is let through, closing the circuit if it succeeds and reopening it if it fails.
+    """
 
-        @property
-        def language_code(self) -> str:
-            assert len(self.language_codes) == 1
-            return self.language_codes[0]
+    def __init__(self, name: str, *, failures: int, reset_after: timedelta):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self._consecutive_failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
 
-    class VoiceResponse(BaseModel):
-        voices: list[VoiceInfo]
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_after.total_seconds():
+                return False
+            self._trial = True
+            return True
 
-    voice_response = VoiceResponse.model_validate_json(r.content)
-    english_voices = [voice for voice in voice_response.voices if voice.language_code.startswith('en')]
-    print(english_voices)
-    # TODO save these to file
+    def success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info('%s circuit closed', self.name)
+                set_gauge('circuit_open', 0, circuit=self.name)
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial or (self._opened_at is None and self._consecutive_failures >= self.failures):
+                if not self._trial:
+                    logger.warning('%s circuit opened after %d failures', self.name, self._consecutive_failures)
+                    set_gauge('circuit_open', 1, circuit=self.name)
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+@cache
+def get_breaker() -> CircuitBreaker:
+    settings = get_settings()
+    return CircuitBreaker('tts', failures=settings.tts_breaker_failures, reset_after=settings.tts_breaker_reset)
+
+
+# offline engines, tried in order, used when Google TTS fails or is too slow
+offline_commands = {
+    'espeak-ng': ['espeak-ng', '-w', '{file}', '{text}'],
+    'espeak': ['espeak', '-w', '{file}', '{text}'],
+    'say': ['say', '--file-format=WAVE', '--data-format=LEI16@24000', '-o', '{file}', '{text}'],
+}
+
+
+@cache
+def offline_engine() -> str | None:
+    engine = next((name for name in offline_commands if shutil.which(name)), None)
+    if engine is None:
+        logger.info('No offline TTS engine found, install espeak-ng to have speech during TTS outages')
+    return engine
+
+
+def offline_synthesize(text: str) -> Path | None:
+    """Synthesize `text` with a local engine (espeak-ng or espeak, or `say` on macOS), returns `None` if there's no
+    engine or it fails.
+
+    The voice is poorer than Google's, but it works offline and takes milliseconds. Results are cached like Google's.
+    """
+    if (engine := offline_engine()) is None:
+        return None
+    cache_key = audio_cache.key(text, engine, sys.platform, {})
+    if cached := audio_cache.get(cache_key):
+        return cached
+    with tempfile.TemporaryDirectory() as tmp:
+        file = Path(tmp) / 'speech.wav'
+        command = [arg.format(file=file, text=text) for arg in offline_commands[engine]]
+        try:
+            with span('tts_offline'):
+                subprocess.run(command, check=True, capture_output=True, timeout=5)
+            audio = file.read_bytes()
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning('Offline TTS with %s failed: %s', engine, e)
+            return None
+    return audio_cache.put(cache_key, audio)
 
 
 def get_auth_token() -> str:
-    credentials = Credentials.from_service_account_file(  # type: ignore[reportUnknownMemberType]
-        'service-account.json', scopes=google_auth_scopes
-    )
-    if credentials.token is None:  # type: ignore[reportUnknownMemberType]
-        credentials.refresh(GoogleAuthRequest())  # type: ignore[reportUnknownMemberType]
-    return credentials.token  # type: ignore[reportUnknownMemberType]
+    with span('tts_token'):
+        return token_provider.token()
+
+
+class TokenProvider:
+    """Process-wide cache of the service account's access token.
+
+    Credentials are loaded once and held in memory, the token is refreshed in a background thread shortly before it
+    expires so callers should never wait on a token request. Concurrent refreshes are coalesced into one.
+    """
+
+    # refresh in the background when the token expires within this time
+    refresh_margin = timedelta(minutes=5)
+    # delay before retrying a failed background refresh
+    retry_delay = timedelta(seconds=30)
+
+    def __init__(self, service_account_file: Path):
+        self._service_account_file = service_account_file
+        self._credentials: Credentials | None = None
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+
+    def token(self) -> str:
+        credentials = self._credentials
+        if credentials is None or not credentials.valid:
+            with self._lock:
+                # another thread may have refreshed while we were waiting for the lock
+                credentials = self._credentials
+                if credentials is None or not credentials.valid:
+                    credentials = self._refresh()
+        return credentials.token  # type: ignore[reportUnknownMemberType]
+
+    def close(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+
+    def _refresh(self) -> Credentials:
+        """Refresh the token, the lock must be held."""
+        if self._credentials is None:
+            from google.oauth2.service_account import Credentials
+
+            self._credentials = Credentials.from_service_account_file(  # type: ignore[reportUnknownMemberType]
+                str(self._service_account_file), scopes=google_auth_scopes
+            )
+        credentials = self._credentials
+        credentials.refresh(http_client.google_auth_request())  # type: ignore[reportUnknownMemberType]
+
+        # google-auth uses naive UTC datetimes for expiry
+        expiry: datetime = credentials.expiry  # type: ignore[reportUnknownMemberType]
+        delay = expiry - datetime.now(tz=timezone.utc).replace(tzinfo=None) - self.refresh_margin
+        self._schedule(max(delay, timedelta()))
+        return credentials
+
+    def _schedule(self, delay: timedelta) -> None:
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay.total_seconds(), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception:
+                logger.exception('Error refreshing TTS auth token in the background')
+                self._schedule(self.retry_delay)
+            else:
+                logger.debug('Refreshed TTS auth token in the background')
+
+
+token_provider = TokenProvider(Path('service-account.json'))
 
 
 @dataclass
@@ -93,266 +349,10 @@ class Voice:
     name: str
     language_code: str
 
+    @classmethod
+    def from_name(cls, name: str) -> Voice:
+        # names start with the language code, e.g. "en-GB-Chirp3-HD-Zephyr"
+        return cls(name, '-'.join(name.split('-')[:2]))
+
 
-english_voices = [
-    Voice(name='Achernar', language_code='en-US'),
-    Voice(name='Achird', language_code='en-US'),
-    Voice(name='Algenib', language_code='en-US'),
-    Voice(name='Algieba', language_code='en-US'),
-    Voice(name='Alnilam', language_code='en-US'),
-    Voice(name='Aoede', language_code='en-US'),
-    Voice(name='Autonoe', language_code='en-US'),
-    Voice(name='Callirrhoe', language_code='en-US'),
-    Voice(name='Charon', language_code='en-US'),
-    Voice(name='Despina', language_code='en-US'),
-    Voice(name='Enceladus', language_code='en-US'),
-    Voice(name='Erinome', language_code='en-US'),
-    Voice(name='Fenrir', language_code='en-US'),
-    Voice(name='Gacrux', language_code='en-US'),
-    Voice(name='Iapetus', language_code='en-US'),
-    Voice(name='Kore', language_code='en-US'),
-    Voice(name='Laomedeia', language_code='en-US'),
-    Voice(name='Leda', language_code='en-US'),
-    Voice(name='Orus', language_code='en-US'),
-    Voice(name='Puck', language_code='en-US'),
-    Voice(name='Pulcherrima', language_code='en-US'),
-    Voice(name='Rasalgethi', language_code='en-US'),
-    Voice(name='Sadachbia', language_code='en-US'),
-    Voice(name='Sadaltager', language_code='en-US'),
-    Voice(name='Schedar', language_code='en-US'),
-    Voice(name='Sulafat', language_code='en-US'),
-    Voice(name='Umbriel', language_code='en-US'),
-    Voice(name='Vindemiatrix', language_code='en-US'),
-    Voice(name='Zephyr', language_code='en-US'),
-    Voice(name='Zubenelgenubi', language_code='en-US'),
-    Voice(name='en-AU-Chirp-HD-D', language_code='en-AU'),
-    Voice(name='en-AU-Chirp-HD-F', language_code='en-AU'),
-    Voice(name='en-AU-Chirp-HD-O', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Achernar', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Achird', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Algenib', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Algieba', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Alnilam', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Aoede', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Autonoe', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Callirrhoe', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Charon', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Despina', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Enceladus', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Erinome', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Fenrir', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Gacrux', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Iapetus', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Kore', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Laomedeia', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Leda', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Orus', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Puck', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Pulcherrima', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Rasalgethi', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Sadachbia', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Sadaltager', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Schedar', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Sulafat', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Umbriel', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Vindemiatrix', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Zephyr', language_code='en-AU'),
-    Voice(name='en-AU-Chirp3-HD-Zubenelgenubi', language_code='en-AU'),
-    Voice(name='en-AU-Neural2-A', language_code='en-AU'),
-    Voice(name='en-AU-Neural2-B', language_code='en-AU'),
-    Voice(name='en-AU-Neural2-C', language_code='en-AU'),
-    Voice(name='en-AU-Neural2-D', language_code='en-AU'),
-    Voice(name='en-AU-News-E', language_code='en-AU'),
-    Voice(name='en-AU-News-F', language_code='en-AU'),
-    Voice(name='en-AU-News-G', language_code='en-AU'),
-    Voice(name='en-AU-Polyglot-1', language_code='en-AU'),
-    Voice(name='en-AU-Standard-A', language_code='en-AU'),
-    Voice(name='en-AU-Standard-B', language_code='en-AU'),
-    Voice(name='en-AU-Standard-C', language_code='en-AU'),
-    Voice(name='en-AU-Standard-D', language_code='en-AU'),
-    Voice(name='en-AU-Wavenet-A', language_code='en-AU'),
-    Voice(name='en-AU-Wavenet-B', language_code='en-AU'),
-    Voice(name='en-AU-Wavenet-C', language_code='en-AU'),
-    Voice(name='en-AU-Wavenet-D', language_code='en-AU'),
-    Voice(name='en-GB-Chirp-HD-D', language_code='en-GB'),
-    Voice(name='en-GB-Chirp-HD-F', language_code='en-GB'),
-    Voice(name='en-GB-Chirp-HD-O', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Achernar', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Achird', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Algenib', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Algieba', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Alnilam', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Aoede', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Autonoe', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Callirrhoe', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Charon', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Despina', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Enceladus', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Erinome', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Fenrir', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Gacrux', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Iapetus', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Kore', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Laomedeia', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Leda', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Orus', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Puck', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Pulcherrima', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Rasalgethi', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Sadachbia', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Sadaltager', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Schedar', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Sulafat', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Umbriel', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Vindemiatrix', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Zephyr', language_code='en-GB'),
-    Voice(name='en-GB-Chirp3-HD-Zubenelgenubi', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-A', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-B', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-C', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-D', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-F', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-N', language_code='en-GB'),
-    Voice(name='en-GB-Neural2-O', language_code='en-GB'),
-    Voice(name='en-GB-News-G', language_code='en-GB'),
-    Voice(name='en-GB-News-H', language_code='en-GB'),
-    Voice(name='en-GB-News-I', language_code='en-GB'),
-    Voice(name='en-GB-News-J', language_code='en-GB'),
-    Voice(name='en-GB-News-K', language_code='en-GB'),
-    Voice(name='en-GB-News-L', language_code='en-GB'),
-    Voice(name='en-GB-News-M', language_code='en-GB'),
-    Voice(name='en-GB-Standard-A', language_code='en-GB'),
-    Voice(name='en-GB-Standard-B', language_code='en-GB'),
-    Voice(name='en-GB-Standard-C', language_code='en-GB'),
-    Voice(name='en-GB-Standard-D', language_code='en-GB'),
-    Voice(name='en-GB-Standard-F', language_code='en-GB'),
-    Voice(name='en-GB-Standard-N', language_code='en-GB'),
-    Voice(name='en-GB-Standard-O', language_code='en-GB'),
-    Voice(name='en-GB-Studio-B', language_code='en-GB'),
-    Voice(name='en-GB-Studio-C', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-A', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-B', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-C', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-D', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-F', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-N', language_code='en-GB'),
-    Voice(name='en-GB-Wavenet-O', language_code='en-GB'),
-    Voice(name='en-IN-Chirp-HD-D', language_code='en-IN'),
-    Voice(name='en-IN-Chirp-HD-F', language_code='en-IN'),
-    Voice(name='en-IN-Chirp-HD-O', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Achernar', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Achird', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Algenib', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Algieba', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Alnilam', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Aoede', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Autonoe', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Callirrhoe', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Charon', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Despina', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Enceladus', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Erinome', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Fenrir', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Gacrux', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Iapetus', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Kore', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Laomedeia', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Leda', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Orus', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Puck', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Pulcherrima', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Rasalgethi', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Sadachbia', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Sadaltager', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Schedar', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Sulafat', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Umbriel', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Vindemiatrix', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Zephyr', language_code='en-IN'),
-    Voice(name='en-IN-Chirp3-HD-Zubenelgenubi', language_code='en-IN'),
-    Voice(name='en-IN-Neural2-A', language_code='en-IN'),
-    Voice(name='en-IN-Neural2-B', language_code='en-IN'),
-    Voice(name='en-IN-Neural2-C', language_code='en-IN'),
-    Voice(name='en-IN-Neural2-D', language_code='en-IN'),
-    Voice(name='en-IN-Standard-A', language_code='en-IN'),
-    Voice(name='en-IN-Standard-B', language_code='en-IN'),
-    Voice(name='en-IN-Standard-C', language_code='en-IN'),
-    Voice(name='en-IN-Standard-D', language_code='en-IN'),
-    Voice(name='en-IN-Standard-E', language_code='en-IN'),
-    Voice(name='en-IN-Standard-F', language_code='en-IN'),
-    Voice(name='en-IN-Wavenet-A', language_code='en-IN'),
-    Voice(name='en-IN-Wavenet-B', language_code='en-IN'),
-    Voice(name='en-IN-Wavenet-C', language_code='en-IN'),
-    Voice(name='en-IN-Wavenet-D', language_code='en-IN'),
-    Voice(name='en-IN-Wavenet-E', language_code='en-IN'),
-    Voice(name='en-IN-Wavenet-F', language_code='en-IN'),
-    Voice(name='en-US-Casual-K', language_code='en-US'),
-    Voice(name='en-US-Chirp-HD-D', language_code='en-US'),
-    Voice(name='en-US-Chirp-HD-F', language_code='en-US'),
-    Voice(name='en-US-Chirp-HD-O', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Achernar', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Achird', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Algenib', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Algieba', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Alnilam', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Aoede', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Autonoe', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Callirrhoe', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Charon', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Despina', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Enceladus', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Erinome', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Fenrir', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Gacrux', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Iapetus', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Kore', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Laomedeia', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Leda', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Orus', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Puck', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Pulcherrima', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Rasalgethi', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Sadachbia', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Sadaltager', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Schedar', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Sulafat', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Umbriel', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Vindemiatrix', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Zephyr', language_code='en-US'),
-    Voice(name='en-US-Chirp3-HD-Zubenelgenubi', language_code='en-US'),
-    Voice(name='en-US-Neural2-A', language_code='en-US'),
-    Voice(name='en-US-Neural2-C', language_code='en-US'),
-    Voice(name='en-US-Neural2-D', language_code='en-US'),
-    Voice(name='en-US-Neural2-E', language_code='en-US'),
-    Voice(name='en-US-Neural2-F', language_code='en-US'),
-    Voice(name='en-US-Neural2-G', language_code='en-US'),
-    Voice(name='en-US-Neural2-H', language_code='en-US'),
-    Voice(name='en-US-Neural2-I', language_code='en-US'),
-    Voice(name='en-US-Neural2-J', language_code='en-US'),
-    Voice(name='en-US-News-K', language_code='en-US'),
-    Voice(name='en-US-News-L', language_code='en-US'),
-    Voice(name='en-US-News-N', language_code='en-US'),
-    Voice(name='en-US-Polyglot-1', language_code='en-US'),
-    Voice(name='en-US-Standard-A', language_code='en-US'),
-    Voice(name='en-US-Standard-B', language_code='en-US'),
-    Voice(name='en-US-Standard-C', language_code='en-US'),
-    Voice(name='en-US-Standard-D', language_code='en-US'),
-    Voice(name='en-US-Standard-E', language_code='en-US'),
-    Voice(name='en-US-Standard-F', language_code='en-US'),
-    Voice(name='en-US-Standard-G', language_code='en-US'),
-    Voice(name='en-US-Standard-H', language_code='en-US'),
-    Voice(name='en-US-Standard-I', language_code='en-US'),
-    Voice(name='en-US-Standard-J', language_code='en-US'),
-    Voice(name='en-US-Studio-O', language_code='en-US'),
-    Voice(name='en-US-Studio-Q', language_code='en-US'),
-    Voice(name='en-US-Wavenet-A', language_code='en-US'),
-    Voice(name='en-US-Wavenet-B', language_code='en-US'),
-    Voice(name='en-US-Wavenet-C', language_code='en-US'),
-    Voice(name='en-US-Wavenet-D', language_code='en-US'),
-    Voice(name='en-US-Wavenet-E', language_code='en-US'),
-    Voice(name='en-US-Wavenet-F', language_code='en-US'),
-    Voice(name='en-US-Wavenet-G', language_code='en-US'),
-    Voice(name='en-US-Wavenet-H', language_code='en-US'),
-    Voice(name='en-US-Wavenet-I', language_code='en-US'),
-    Voice(name='en-US-Wavenet-J', language_code='en-US'),
-]
+default_voice = Voice(name='en-GB-Chirp3-HD-Zephyr', language_code='en-GB')
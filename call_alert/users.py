@@ -0,0 +1,182 @@
+"""Multi-user mode, one daemon serving many users' calendars.
+
+Users are listed in `users.json`, each user's credentials and state live in `users/<name>/`. All users share
+one scheduler, the HTTP connection pool, the calendar fetch pool and the Calendar discovery document, so each
+additional user only costs its credentials, events and timers. Users can be sharded across worker processes with
+`--workers`.
+
+Run `python -m call_alert.users authorize <name>` to go through the Google auth flow for a user, then
+`python -m call_alert.users run` to start the daemon.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import subprocess
+import sys
+import zlib
+from functools import partial
+from pathlib import Path
+
+from pydantic import BaseModel, TypeAdapter
+
+from .alerts import AlertRoute, EventAlerts
+from .calendar_get import CalendarSession, EventStore, authenticate_google_calendar
+from .http_client import close_client
+from .metrics import start_metrics
+from .notification import BackendName, dispatcher_for
+from .scheduler import Scheduler
+from .settings import get_settings
+from .state import StateStore
+
+__all__ = 'UserConfig', 'load_users', 'run_users', 'shard_users'
+
+logger = logging.getLogger('call_alert.users')
+
+users_file = Path('users.json')
+users_dir = Path('users')
+
+
+class UserConfig(BaseModel):
+    name: str
+    calendar_ids: list[str] = ['primary']
+    # where this user's notifications are shown, e.g. the D-Bus address of their desktop session
+    notification_backend: BackendName = 'auto'
+    dbus_address: str | None = None
+    # whether alerts are spoken on this machine, in which voice and on which audio device (default output if unset)
+    speak: bool = True
+    voice: str | None = None
+    audio_device: str | None = None
+    # whether this machine's camera and microphones show the user is in a call, by default only for users whose
+    # alerts are spoken here since other users aren't at this machine
+    presence: bool | None = None
+
+    @property
+    def token_file(self) -> Path:
+        return users_dir / self.name / 'calendar-token.json'
+
+    @property
+    def state_file(self) -> Path:
+        return users_dir / self.name / 'state.db'
+
+    def route(self) -> AlertRoute:
+        return AlertRoute(
+            dispatcher_for(self.notification_backend, self.dbus_address),
+            self.speak,
+            self.voice,
+            presence=self.speak if self.presence is None else self.presence,
+            audio_device=self.audio_device,
+        )
+
+
+users_schema = TypeAdapter(list[UserConfig])
+
+
+def load_users(path: Path = users_file) -> list[UserConfig]:
+    return users_schema.validate_json(path.read_bytes())
+
+
+def shard_users(users: list[UserConfig], shard: int, shards: int) -> list[UserConfig]:
+    """Users belonging to `shard` out of `shards`, a user's shard only depends on their name."""
+    return [user for user in users if zlib.crc32(user.name.encode()) % shards == shard]
+
+
+async def run_users(users: list[UserConfig]) -> None:
+    settings = get_settings()
+    # one user's error (e.g. revoked credentials) mustn't stop alerts for everyone else
+    scheduler = Scheduler(stop_on_error=False)
+    for user in users:
+        if not user.token_file.exists():
+            # retrying can't help until the user has been through the auth flow
+            logger.error('Skipping user %r, not authorized, run `python -m call_alert.users authorize`', user.name)
+            continue
+        state = StateStore.open(user.state_file)
+        alerts = EventAlerts(
+            None,
+            EventStore.load(state),
+            scheduler,
+            settings,
+            calendar_ids=user.calendar_ids,
+            route=user.route(),
+            state=state,
+        )
+        alerts.resume()
+        # a user who can't connect (e.g. during an outage at boot) is retried with backoff rather than skipped
+        connect = partial(CalendarSession.connect, False, user.token_file)
+        name = f'Google Calendar for user {user.name!r}'
+        await alerts.connect(connect, name=name)
+    logger.info('Serving %d users', len(users))
+    await scheduler.run()
+
+
+def run_workers(workers: int, path: Path) -> None:
+    """Start a process for each shard of users and wait for them, all are stopped if any exits."""
+    processes = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'call_alert.users', 'run', '--users', str(path), '--shard', f'{shard}/{workers}']
+        )
+        for shard in range(workers)
+    ]
+    try:
+        while all(p.poll() is None for p in processes):
+            try:
+                processes[0].wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.wait()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO, format='[%(asctime)s] %(name)s %(levelname)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(prog='python -m call_alert.users', description='Serve many users from one daemon')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='run the daemon')
+    run.add_argument('--users', type=Path, default=users_file, help='users file, default: %(default)s')
+    run.add_argument('--workers', type=int, default=1, help='number of worker processes to shard users across')
+    run.add_argument('--shard', help='serve only shard "i/n" of the users, used by --workers')
+    authorize = commands.add_parser('authorize', help='run the Google auth flow for a user')
+    authorize.add_argument('name')
+    authorize.add_argument('--users', type=Path, default=users_file, help='users file, default: %(default)s')
+    args = parser.parse_args()
+
+    users = load_users(args.users)
+    if args.command == 'authorize':
+        user = next((u for u in users if u.name == args.name), None)
+        if user is None:
+            parser.error(f'user {args.name!r} not found in {args.users}')
+        user.token_file.parent.mkdir(parents=True, exist_ok=True)
+        authenticate_google_calendar(True, user.token_file)
+        return
+
+    if args.workers > 1:
+        run_workers(args.workers, args.users)
+        return
+    settings = get_settings()
+    shard = 0
+    if args.shard:
+        shard, shards = map(int, args.shard.split('/'))
+        users = shard_users(users, shard, shards)
+    # each worker serves metrics on its own port
+    metrics_port = settings.metrics_port + shard if settings.metrics_port is not None else None
+    jsonl = settings.metrics_jsonl
+    if jsonl and args.shard:
+        jsonl = jsonl.with_name(f'{jsonl.stem}-{shard}{jsonl.suffix}')
+    start_metrics(settings.metrics_host, metrics_port, jsonl)
+    try:
+        asyncio.run(run_users(users))
+    except KeyboardInterrupt:
+        logger.info('stopped')
+    finally:
+        close_client()
+
+
+if __name__ == '__main__':
+    main()
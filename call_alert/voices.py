@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import cache
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from . import http_client
+from .settings import get_settings
+from .text_to_speech import get_auth_token
+
+__all__ = 'VoiceCatalog', 'VoiceInfo', 'get_catalog'
+
+logger = logging.getLogger('call_alert.voices')
+
+catalog_file = Path('tts-voices.json')
+# refetch the voice list from the API when the saved catalog is older than this
+catalog_ttl = timedelta(days=7)
+
+
+@dataclass(frozen=True, slots=True)
+class VoiceInfo:
+    name: str
+    language_codes: tuple[str, ...]
+    gender: str
+    sample_rate: int
+
+    @property
+    def language_code(self) -> str:
+        return self.language_codes[0]
+
+    @property
+    def family(self) -> str:
+        """Voice family e.g. "Chirp3-HD", "Neural2" or "Wavenet", empty for voices without a family in their name."""
+        # names look like "en-GB-Chirp3-HD-Zephyr"
+        parts = self.name.split('-')
+        return '-'.join(parts[2:-1])
+
+
+class VoiceCatalog:
+    """Available TTS voices, indexed for constant time lookup by language, gender, family and sample rate."""
+
+    def __init__(self, voices: list[VoiceInfo]):
+        self.voices = voices
+        self.by_name = {voice.name: voice for voice in voices}
+        self.by_language: dict[str, list[VoiceInfo]] = defaultdict(list)
+        self.by_gender: dict[str, list[VoiceInfo]] = defaultdict(list)
+        self.by_family: dict[str, list[VoiceInfo]] = defaultdict(list)
+        self.by_sample_rate: dict[int, list[VoiceInfo]] = defaultdict(list)
+        for voice in voices:
+            for language_code in voice.language_codes:
+                self.by_language[language_code].append(voice)
+            self.by_gender[voice.gender].append(voice)
+            self.by_family[voice.family].append(voice)
+            self.by_sample_rate[voice.sample_rate].append(voice)
+
+    def find(
+        self,
+        *,
+        language: str | None = None,
+        gender: str | None = None,
+        family: str | None = None,
+        sample_rate: int | None = None,
+    ) -> list[VoiceInfo]:
+        """Voices matching all the given criteria, in catalog order."""
+        by_name = [(self.by_language, language), (self.by_gender, gender), (self.by_family, family)]
+        candidates = [index.get(key, []) for index, key in by_name if key is not None]
+        if sample_rate is not None:
+            candidates.append(self.by_sample_rate.get(sample_rate, []))
+        if not candidates:
+            return list(self.voices)
+        smallest = min(candidates, key=len)
+        others = [set(c) for c in candidates if c is not smallest]
+        return [voice for voice in smallest if all(voice in other for other in others)]
+
+    @classmethod
+    def load(cls, path: Path = catalog_file, *, ttl: timedelta = catalog_ttl) -> VoiceCatalog:
+        """Load the catalog from `path`, refetching it from the API if it's missing or older than `ttl`."""
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            pass
+        else:
+            if age < ttl.total_seconds():
+                rows = json.loads(path.read_bytes())
+                return cls([VoiceInfo(name, tuple(codes), gender, rate) for name, codes, gender, rate in rows])
+
+        catalog = cls(fetch_voices())
+        catalog.save(path)
+        logger.info('Fetched %d voices, saved to %s', len(catalog.voices), path)
+        return catalog
+
+    def save(self, path: Path) -> None:
+        # rows rather than objects keep the file compact
+        rows = [[v.name, v.language_codes, v.gender, v.sample_rate] for v in self.voices]
+        path.write_text(json.dumps(rows, separators=(',', ':')))
+
+
+@cache
+def get_catalog() -> VoiceCatalog:
+    """The voice catalog, loaded on first use."""
+    return VoiceCatalog.load()
+
+
+def fetch_voices() -> list[VoiceInfo]:
+    r = http_client.request(
+        'GET',
+        f'{get_settings().tts_api_url}voices',
+        headers={'Authorization': f'Bearer {get_auth_token()}'},
+    )
+    if r.status_code != 200:
+        raise ValueError(f'Error getting voices: {r.status_code}, body:\n{r.text}')
+
+    class VoiceResponseInfo(BaseModel):
+        language_codes: list[str] = Field(validation_alias='languageCodes')
+        name: str
+        ssml_gender: Literal['MALE', 'FEMALE', 'NEUTRAL', 'SSML_VOICE_GENDER_UNSPECIFIED'] = Field(
+            validation_alias='ssmlGender'
+        )
+        natural_sample_rate_hertz: int = Field(validation_alias='naturalSampleRateHertz')
+
+    class VoiceResponse(BaseModel):
+        voices: list[VoiceResponseInfo]
+
+    voice_response = VoiceResponse.model_validate_json(r.content)
+    return [
+        VoiceInfo(v.name, tuple(v.language_codes), v.ssml_gender, v.natural_sample_rate_hertz)
+        for v in voice_response.voices
+    ]
+
+
+if __name__ == '__main__':
+    catalog = get_catalog()
+    for family, voices in sorted(catalog.by_family.items()):
+        english = [v for v in voices if v.language_code.startswith('en')]
+        print(f'{family or "(no family)"}: {len(voices)} voices, {len(english)} English')
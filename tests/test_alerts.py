@@ -0,0 +1,177 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import cast
+
+import pytest
+
+from call_alert import presence
+from call_alert.alerts import AlertRoute, EventAlerts, alert_offsets, event_alert, retry_interval
+from call_alert.calendar_get import CalendarSession, Event, EventStore
+from call_alert.notification import InMemoryBackend, NotificationDispatcher
+from call_alert.presence import PresenceDetector
+from call_alert.scheduler import Scheduler
+from call_alert.settings import Settings
+from call_alert.state import StateStore, fired_retention
+
+
+def make_event(event_id: str, start: datetime, summary: str = 'Standup') -> Event:
+    return Event(event_id, summary, start, start + timedelta(minutes=30), 'https://meet.google.com/abc-defg-hij')
+
+
+def make_alerts() -> EventAlerts:
+    return EventAlerts(
+        None, EventStore(), Scheduler(), Settings(), route=AlertRoute(speak=False), state=StateStore.in_memory()
+    )
+
+
+def alert_times(alerts: EventAlerts, event_id: str) -> list[datetime]:
+    return [t.when for t in alerts.sequences[event_id].timers if t.name.startswith('alert') and not t.cancelled]
+
+
+def test_retry_interval():
+    intervals = [retry_interval(failures, timedelta(minutes=5)) for failures in range(1, 8)]
+    assert intervals == [timedelta(seconds=s) for s in (10, 20, 40, 80, 160, 300, 300)]
+    assert retry_interval(1000, timedelta(minutes=5)) == timedelta(minutes=5)
+
+
+def test_poll_interval_backs_off():
+    alerts = make_alerts()
+    settings = alerts.settings
+    intervals: list[timedelta] = []
+    for unchanged in range(7):
+        alerts._unchanged_polls = unchanged
+        intervals.append(alerts.poll_interval())
+    assert intervals[0] == settings.poll_min_interval
+    assert intervals[1] == settings.poll_min_interval * 2
+    assert intervals[-1] == settings.poll_max_interval
+
+
+def test_reconcile_new_event():
+    alerts = make_alerts()
+    start = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+
+    assert alerts.reconcile([make_event('a', start)]) is True
+    assert alert_times(alerts, 'a') == [start + offset for offset in alert_offsets]
+
+
+def test_reconcile_unchanged_event():
+    alerts = make_alerts()
+    start = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+    alerts.reconcile([make_event('a', start)])
+    sequence = alerts.sequences['a']
+
+    # a new summary is picked up without rescheduling
+    assert alerts.reconcile([make_event('a', start, summary='Retro')]) is False
+    assert alerts.sequences['a'] is sequence
+    assert sequence.event.summary == 'Retro'
+    assert not any(t.cancelled for t in sequence.timers)
+
+
+def test_reconcile_moved_event():
+    alerts = make_alerts()
+    start = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+    alerts.reconcile([make_event('a', start)])
+    old_timers = alerts.sequences['a'].timers
+
+    moved = start + timedelta(hours=2)
+    assert alerts.reconcile([make_event('a', moved)]) is True
+    assert all(t.cancelled for t in old_timers)
+    assert alert_times(alerts, 'a') == [moved + offset for offset in alert_offsets]
+
+
+def test_reconcile_deleted_event():
+    alerts = make_alerts()
+    start = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+    alerts.reconcile([make_event('a', start), make_event('b', start)])
+    timers = alerts.sequences['a'].timers
+
+    assert alerts.reconcile([make_event('b', start)]) is True
+    assert all(t.cancelled for t in timers)
+    assert list(alerts.sequences) == ['b']
+
+
+def test_reconcile_finished_event_dropped():
+    alerts = make_alerts()
+    # too long ago to be returned by the calendar any more, so its absence isn't a deletion
+    start = datetime.now(tz=timezone.utc) - timedelta(minutes=20)
+    alerts.reconcile([make_event('a', start)])
+
+    assert alerts.reconcile([]) is False
+    assert alerts.sequences == {}
+
+
+class BrokenPresence(PresenceDetector):
+    def active(self) -> bool:
+        raise PermissionError('/proc/1/fd')
+
+
+def test_presence_error_alert_given(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(presence, 'get_detector', BrokenPresence)
+    backend = InMemoryBackend()
+    route = AlertRoute(dispatcher=NotificationDispatcher(backend), speak=False)
+    outcomes: list[str] = []
+    event = make_event('a', datetime.now(tz=timezone.utc))
+
+    asyncio.run(event_alert(event, 0, Settings(), route, on_handled=outcomes.append))
+
+    assert route.dispatcher and route.dispatcher.flush(5)
+    assert [(n.title, n.message) for n in backend.sent] == [('Call has just started', 'Standup')]
+    assert outcomes == ['given']
+
+
+def test_connect_retried():
+    alerts = make_alerts()
+    session = cast(CalendarSession, object())
+    attempts: list[None] = []
+
+    def connect() -> CalendarSession:
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise OSError('offline')
+        return session
+
+    connected: list[CalendarSession] = []
+    asyncio.run(alerts.connect(connect, on_connected=connected.append))
+    assert alerts.session is None
+    [(_, _, retry)] = alerts.scheduler._heap
+    assert retry.name == 'connect'
+    assert retry.when - datetime.now(tz=timezone.utc) == pytest.approx(timedelta(seconds=10), abs=timedelta(seconds=1))
+
+    asyncio.run(retry.callback())
+    assert alerts.session is session
+    assert connected == [session]
+    assert alerts._next_poll is not None
+
+
+def test_resume_after_restart():
+    state = StateStore.in_memory()
+    now = datetime.now(tz=timezone.utc)
+    # the call started 3 minutes ago, its first alert was given before the restart
+    event = make_event('a', now - timedelta(minutes=3))
+    store = EventStore.load(state)
+    store.calendar('primary').events[event.id] = event
+    store.save()
+    state.record_alert(event.id, event.start, alert_offsets[0], 'given', event.start)
+
+    alerts = EventAlerts(
+        None, EventStore.load(state), Scheduler(), Settings(), route=AlertRoute(speak=False), state=state
+    )
+    alerts.resume()
+
+    alert_timers = {t.name: t.when for t in alerts.sequences['a'].timers if t.name.startswith('alert')}
+    # the given alert isn't repeated, the missed 2 minute alert is given straight away, once
+    assert list(alert_timers) == ['alert a +0:02:00', 'alert a +0:08:00']
+    assert alert_timers['alert a +0:02:00'] - now < timedelta(seconds=5)
+    assert alert_timers['alert a +0:08:00'] == event.start + timedelta(minutes=8)
+
+
+def test_fired_alerts_pruned():
+    state = StateStore.in_memory()
+    start = datetime.now(tz=timezone.utc) - timedelta(days=3)
+    state.record_alert('a', start, alert_offsets[0], 'given', start)
+    state.record_alert('b', start, alert_offsets[0], 'skipped', start + fired_retention)
+
+    state.prune_alerts(start + fired_retention + timedelta(minutes=1))
+
+    assert state.fired_offsets('a', start) == set()
+    assert state.fired_offsets('b', start) == {alert_offsets[0]}
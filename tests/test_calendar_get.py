@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from call_alert import calendar_get
+from call_alert.calendar_get import CalendarStore, EventsPage, TimeRangeCalEvent, sync_calendar_events
+
+now = datetime(2026, 1, 5, 9, tzinfo=timezone.utc)
+
+
+def raw_event(event_id: str, start: datetime) -> dict[str, Any]:
+    return {
+        'id': event_id,
+        'summary': f'Call {event_id}',
+        'creator': {'email': 'alice@example.com'},
+        'organizer': {'email': 'alice@example.com'},
+        'htmlLink': f'https://www.google.com/calendar/event?eid={event_id}',
+        'hangoutLink': 'https://meet.google.com/abc-defg-hij',
+        'start': {'dateTime': start.isoformat(), 'timeZone': 'UTC'},
+        'end': {'dateTime': (start + timedelta(minutes=30)).isoformat(), 'timeZone': 'UTC'},
+    }
+
+
+def events_page(*events: dict[str, Any], sync_token: str, etag: str | None = None) -> EventsPage:
+    return EventsPage.model_validate({'items': events, 'nextSyncToken': sync_token, 'etag': etag})
+
+
+def test_invalidated_sync_token_full_sync(monkeypatch: pytest.MonkeyPatch):
+    store = CalendarStore(sync_token='stale', synced_until=now + calendar_get.sync_horizon)
+    for event in events_page(raw_event('deleted', now + timedelta(hours=1)), sync_token='stale').items:
+        store.apply(event)
+    requests: list[dict[str, Any]] = []
+
+    def list_event_pages(_service: object, *, calendar_id: str, etag: str | None = None, **params: Any) -> EventsPage:
+        requests.append(params)
+        if 'syncToken' in params:
+            raise HttpError(
+                httplib2.Response({'status': 410}), b'{"error": {"message": "Sync token is no longer valid"}}'
+            )
+        return events_page(raw_event('kept', now + timedelta(hours=2)), sync_token='fresh')
+
+    monkeypatch.setattr(calendar_get, 'list_event_pages', list_event_pages)
+
+    assert sync_calendar_events(object(), store, now) is True
+    assert [sorted(params) for params in requests] == [['syncToken'], ['timeMax', 'timeMin']]
+    assert store.sync_token == 'fresh'
+    assert store.synced_until == now + calendar_get.sync_horizon
+    assert list(store.events) == ['kept']
+
+
+def test_other_sync_errors_raised(monkeypatch: pytest.MonkeyPatch):
+    store = CalendarStore(sync_token='token', synced_until=now + calendar_get.sync_horizon)
+
+    def list_event_pages(_service: object, **_params: Any) -> EventsPage:
+        raise HttpError(httplib2.Response({'status': 500}), b'{}')
+
+    monkeypatch.setattr(calendar_get, 'list_event_pages', list_event_pages)
+
+    with pytest.raises(HttpError):
+        sync_calendar_events(object(), store, now)
+    assert store.sync_token == 'token'
+
+
+def test_full_sync_etag_used_by_next_poll(monkeypatch: pytest.MonkeyPatch):
+    store = CalendarStore()
+    etags: list[str | None] = []
+
+    def list_event_pages(_service: object, *, calendar_id: str, etag: str | None = None, **params: Any) -> EventsPage:
+        etags.append(etag)
+        if 'syncToken' in params and etag == '"calendar-etag"':
+            raise HttpError(httplib2.Response({'status': 304}), b'')
+        return events_page(raw_event('a', now + timedelta(hours=1)), sync_token='token', etag='"calendar-etag"')
+
+    monkeypatch.setattr(calendar_get, 'list_event_pages', list_event_pages)
+
+    assert sync_calendar_events(object(), store, now) is True
+    # the poll straight after a full sync is already conditional, so an unchanged calendar costs a 304
+    assert sync_calendar_events(object(), store, now) is False
+    assert etags == [None, '"calendar-etag"']
+    assert list(store.events) == ['a']
+
+
+@pytest.mark.parametrize(
+    'description,link',
+    [
+        ('Join with Google Meet: https://meet.google.com/abc-defg-hij.', 'https://meet.google.com/abc-defg-hij'),
+        (
+            'Zoom (https://us02web.zoom.us/j/81234567890?pwd=abc123).',
+            'https://us02web.zoom.us/j/81234567890?pwd=abc123',
+        ),
+        ('Personal room: https://acme.zoom.us/my/alice, see you', 'https://acme.zoom.us/my/alice'),
+        (
+            'Join: https://teams.microsoft.com/l/meetup-join/19%3ameeting_abc%40thread.v2/0?context=%7b%7d;',
+            'https://teams.microsoft.com/l/meetup-join/19%3ameeting_abc%40thread.v2/0?context=%7b%7d',
+        ),
+        (
+            'Join: https://teams.microsoft.com/meet/2345678901234?p=AbCdEfGh.',
+            'https://teams.microsoft.com/meet/2345678901234?p=AbCdEfGh',
+        ),
+        (
+            'Join the meeting now<https://nam12.safelinks.protection.outlook.com/?url=teams.microsoft.com>',
+            'https://nam12.safelinks.protection.outlook.com/?url=teams.microsoft.com',
+        ),
+        (
+            'Help: https://help.webex.com/en-us\nJoin: https://acme.webex.com/acme/j.php?MTID=m0123abc',
+            'https://acme.webex.com/acme/j.php?MTID=m0123abc',
+        ),
+        ('Webex (https://acme.webex.com/meet/alice)', 'https://acme.webex.com/meet/alice'),
+        ('https://acme.webex.com/join/alice,', 'https://acme.webex.com/join/alice'),
+        (
+            'https://web.webex.com/wbxmjs/joinservice/sites/acme/meeting/download/0123abc',
+            'https://web.webex.com/wbxmjs/joinservice/sites/acme/meeting/download/0123abc',
+        ),
+        ('Need help? https://help.webex.com/en-us', None),
+        ('No call here, see https://example.com.', None),
+    ],
+)
+def test_video_link(description: str, link: str | None):
+    data = raw_event('a', now) | {'description': description}
+    del data['hangoutLink']
+    assert TimeRangeCalEvent.model_validate(data).video_link == link
+
+
+def test_video_link_preference():
+    data = raw_event('a', now) | {
+        'location': 'https://acme.zoom.us/j/123',
+        'description': 'https://acme.webex.com/meet/x',
+    }
+    assert TimeRangeCalEvent.model_validate(data).video_link == 'https://meet.google.com/abc-defg-hij'
+    del data['hangoutLink']
+    assert TimeRangeCalEvent.model_validate(data).video_link == 'https://acme.zoom.us/j/123'
+    data['location'] = 'Room 1, https://acme.webex.com/meet/room1.'
+    assert TimeRangeCalEvent.model_validate(data).video_link == 'https://acme.webex.com/meet/room1'
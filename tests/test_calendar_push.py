@@ -0,0 +1,40 @@
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from call_alert.calendar_push import PushReceiver, WatchChannel, emulate_notification
+
+
+@pytest.fixture
+def receiver() -> Iterator[PushReceiver]:
+    receiver = PushReceiver('127.0.0.1', 0)
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+def make_channel(token: str = 'secret') -> WatchChannel:
+    return WatchChannel('channel', token, 'resource', datetime.now(tz=timezone.utc) + timedelta(hours=1))
+
+
+def test_notification(receiver: PushReceiver):
+    notified = threading.Event()
+    calls: list[None] = []
+
+    def on_notification() -> None:
+        calls.append(None)
+        notified.set()
+
+    receiver.on_notification = on_notification
+    channel = make_channel()
+    receiver.channels[channel.id] = channel.token
+
+    # neither of these should call `on_notification`
+    emulate_notification(receiver.url, channel, state='sync')
+    emulate_notification(receiver.url, make_channel(token='forged'))
+
+    emulate_notification(receiver.url, channel, message_number=2)
+    assert notified.wait(5)
+    assert len(calls) == 1
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from call_alert.notification import InMemoryBackend, Notification, NotificationDispatcher
+
+
+class BlockingBackend(InMemoryBackend):
+    """Holds every notification until `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def send(self, notification: Notification) -> None:
+        self.release.wait(5)
+        if notification.title == 'fail':
+            raise RuntimeError('backend error')
+        super().send(notification)
+
+
+def test_notifications_delivered():
+    backend = InMemoryBackend()
+    dispatcher = NotificationDispatcher(backend)
+
+    dispatcher.notify('Call', 'starts now', link='https://meet.google.com/abc-defg-hij')
+    dispatcher.notify('Call Alert Error!', 'crashed', sound='error')
+
+    assert dispatcher.flush(5) is True
+    assert [(n.title, n.link, n.sound) for n in backend.sent] == [
+        ('Call', 'https://meet.google.com/abc-defg-hij', None),
+        ('Call Alert Error!', None, 'error'),
+    ]
+    assert len(dispatcher.latencies) == 2
+
+
+def test_backend_errors_and_full_queue():
+    backend = BlockingBackend()
+    dispatcher = NotificationDispatcher(backend, max_queue=2)
+
+    dispatcher.notify('fail', 'taken by the worker')
+    # wait for the worker to take the first notification, so the queue has room for two more
+    while dispatcher._queue.qsize():
+        time.sleep(0.001)
+    dispatcher.notify('first', 'queued')
+    dispatcher.notify('second', 'queued')
+    dispatcher.notify('third', 'dropped')
+    backend.release.set()
+
+    assert dispatcher.flush(5) is True
+    # the worker carries on after a backend error
+    assert [n.title for n in backend.sent] == ['first', 'second']
@@ -0,0 +1,53 @@
+import shutil
+from pathlib import Path
+
+from call_alert.presence import LinuxDevicePresence
+
+
+def make_fake_proc(root: Path, processes: dict[int, list[str]]) -> None:
+    """Create a fake `/proc` under `root` where each process has file descriptors pointing at the given paths.
+
+    Use with `LinuxDevicePresence(root=root)` to test without hardware.
+    """
+    for pid, targets in processes.items():
+        fd_dir = root / 'proc' / str(pid) / 'fd'
+        fd_dir.mkdir(parents=True, exist_ok=True)
+        (fd_dir.parent / 'cmdline').write_bytes(f'process-{pid}\0'.encode() if targets else b'')
+        for fd, target in enumerate(targets):
+            (fd_dir / str(fd)).symlink_to(target)
+
+
+def test_camera_in_use(tmp_path: Path):
+    make_fake_proc(tmp_path, {1: ['/dev/null'], 42: ['/dev/null', 'socket:[1234]', '/dev/video0']})
+    detector = LinuxDevicePresence(root=tmp_path)
+
+    assert detector.active() is True
+    # the camera is released when the process exits
+    shutil.rmtree(tmp_path / 'proc' / '42')
+    assert detector.active() is False
+
+
+def test_camera_not_in_use(tmp_path: Path):
+    make_fake_proc(tmp_path, {1: ['/dev/null'], 7: ['/dev/snd/pcmC0D0p']})
+    assert LinuxDevicePresence(root=tmp_path).active() is False
+
+
+def test_microphones(tmp_path: Path):
+    make_fake_proc(tmp_path, {1: ['/dev/snd/pcmC0D0p'], 2: ['/dev/snd/pcmC1D0c']})
+
+    assert LinuxDevicePresence(root=tmp_path).active() is False
+    assert LinuxDevicePresence(root=tmp_path, microphones=True).active() is True
+
+
+def test_kernel_threads_skipped(tmp_path: Path):
+    # kernel threads have no file descriptors and an empty cmdline
+    make_fake_proc(tmp_path, {2: [], 3: ['/dev/null']})
+    detector = LinuxDevicePresence(root=tmp_path)
+
+    assert detector.active() is False
+    # a later scan doesn't look at the kernel thread again, so it's not noticed if it gains a device
+    (tmp_path / 'proc' / '2' / 'fd' / '0').symlink_to('/dev/video0')
+    assert detector.active() is False
+    # but a new process is
+    make_fake_proc(tmp_path, {4: ['/dev/video0']})
+    assert detector.active() is True
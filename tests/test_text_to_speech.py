@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import pytest
+
+from call_alert import text_to_speech
+from call_alert.text_to_speech import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(text_to_speech.time, 'monotonic', clock)
+    return clock
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker('test', failures=2, reset_after=timedelta(seconds=60))
+    breaker.failure()
+    assert breaker.allow() is True
+    breaker.failure()
+    assert breaker.allow() is False
+    return breaker
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker('test', failures=2, reset_after=timedelta(seconds=60))
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.allow() is True
+
+
+def test_half_open_trial_succeeds(clock: FakeClock):
+    breaker = open_breaker()
+    clock.now += 59
+    assert breaker.allow() is False
+
+    clock.now += 1
+    # half open: one trial request, others are still rejected until it finishes
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+
+    breaker.success()
+    assert breaker.allow() is True
+    # closed again, so it takes `failures` failures to reopen
+    breaker.failure()
+    assert breaker.allow() is True
+
+
+def test_half_open_trial_fails(clock: FakeClock):
+    breaker = open_breaker()
+    clock.now += 60
+    assert breaker.allow() is True
+
+    breaker.failure()
+    # reopened straight away, for another `reset_after`
+    assert breaker.allow() is False
+    clock.now += 59
+    assert breaker.allow() is False
+    clock.now += 1
+    assert breaker.allow() is True